@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Benchmark of the throughput of actions, against local stand-ins."""
+
+import argparse
+import asyncio
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+from urllib.parse import unquote, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                os.pardir, 'code'))
+
+from actions import load_action  # noqa: E402
+
+
+class WebDAVStandIn(BaseHTTPRequestHandler):
+    """
+    Answer the few WebDAV requests of the WebDAV action from a directory.
+
+    Ranged PUT are supported, as with Apache mod_dav, so that resumed
+    uploads can be measured too.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    root = ''
+
+    def do_HEAD(self):
+        """Send the size of a file or a directory."""
+        path = self.__path()
+        if not os.path.exists(path):
+            self.__reply(404)
+            return
+        size = 0 if os.path.isdir(path) else os.path.getsize(path)
+        self.__reply(200, {'Content-Length': str(size)}, body=False)
+
+    def do_PUT(self):
+        """Write a file, or a range of a file."""
+        path = self.__path()
+        length = int(self.headers['Content-Length'])
+        offset = 0
+        match = re.match(r'bytes (\d+)-', self.headers.get('Content-Range', ''))
+        if match:
+            offset = int(match.group(1))
+        with open(path, 'r+b' if offset else 'wb') as target:
+            target.seek(offset)
+            while length:
+                chunk = self.rfile.read(min(length, 1024 * 1024))
+                target.write(chunk)
+                length -= len(chunk)
+        self.__reply(201)
+
+    def do_MOVE(self):
+        """Rename a file."""
+        destination = unquote(urlparse(self.headers['Destination']).path)
+        os.replace(self.__path(), self.root + destination)
+        self.__reply(201)
+
+    def do_MKCOL(self):
+        """Create a directory."""
+        os.makedirs(self.__path(), exist_ok=True)
+        self.__reply(201)
+
+    def do_DELETE(self):
+        """Remove a file."""
+        os.remove(self.__path())
+        self.__reply(204)
+
+    def do_PROPFIND(self):
+        """List a directory."""
+        path = unquote(urlparse(self.path).path).rstrip('/')
+        hrefs = ''.join(f'<d:response><d:href>{path}/{name}</d:href>'
+                        f'</d:response>'
+                        for name in sorted(os.listdir(self.__path())))
+        content = f'<?xml version="1.0"?><d:multistatus xmlns:d="DAV:">' \
+                  f'{hrefs}</d:multistatus>'.encode('utf-8')
+        self.__reply(207, {'Content-Type': 'application/xml'}, content)
+
+    def log_message(self, format, *args):
+        """Do not log requests."""
+
+    def __path(self) -> str:
+        """Return the local path of the requested file."""
+        return self.root + unquote(urlparse(self.path).path)
+
+    def __reply(self, code: int, headers: Dict[str, str] = None,
+                content: bytes = b'', body: bool = True):
+        """Send a response, with its length unless it answers a HEAD."""
+        self.send_response(code)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if body:
+            self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def make_files(path: str, count: int, size: int) -> List[str]:
+    """
+    Write files of random content and return their paths.
+
+    :param path : directory of the files
+    :param count : number of files
+    :param size : size of each file, in bytes
+    """
+    files = []
+    for index in range(count):
+        files.append(os.path.join(path, f'host{index}.dot.png'))
+        with open(files[-1], 'wb') as generated:
+            generated.write(os.urandom(size))
+    return files
+
+
+def measure(config: Dict[str, Any], files: List[str]) -> float:
+    """
+    Perform an action on files as GraphBot does, and return its duration.
+
+    :param config : configuration of the action
+    :param files : paths of the files to upload
+    """
+    async def perform():
+        backend = load_action(config['type']).from_config(config)
+        try:
+            await backend.prepare()
+            await backend.upload(files)
+        finally:
+            await backend.wait_calls()
+            await backend.close()
+
+    start = time.monotonic()
+    asyncio.run(perform())
+    return time.monotonic() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--files',
+                        help='number of files to upload',
+                        type=int,
+                        default=20)
+    parser.add_argument('-s', '--size',
+                        help='size of each file, in bytes',
+                        type=int,
+                        default=4 * 1024 * 1024)
+    parser.add_argument('-c', '--concurrency',
+                        help='concurrency of the actions (repeatable)',
+                        type=int,
+                        action='append')
+    parser.add_argument('--s3-endpoint',
+                        help='URL of a local S3 stand-in, e.g. MinIO, '
+                             'with an existing "dgb" bucket')
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix='dgb-bench-')
+    server = None
+    try:
+        os.makedirs(os.path.join(work, 'output'))
+        files = make_files(os.path.join(work, 'output'), args.files,
+                           args.size)
+
+        targets = {'directory': {'type': 'directory',
+                                 'path': os.path.join(work, 'directory')}}
+
+        WebDAVStandIn.root = os.path.join(work, 'webdav')
+        os.makedirs(WebDAVStandIn.root)
+        server = ThreadingHTTPServer(('127.0.0.1', 0), WebDAVStandIn)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        targets['webdav'] = {
+            'type': 'webdav',
+            'hostname': f'http://127.0.0.1:{server.server_address[1]}',
+            'login': 'dgb',
+            'password': 'dgb',
+            'remote_path': 'graphs'
+        }
+
+        if args.s3_endpoint:
+            targets['s3'] = {'type': 's3',
+                             'endpoint_url': args.s3_endpoint,
+                             'bucket': 'dgb',
+                             'remote_path': 'graphs'}
+
+        total = args.files * args.size / 1024 / 1024
+        print(f'{args.files} files of {args.size} bytes ({total:.0f} MB)')
+        for name, target in targets.items():
+            for concurrency in args.concurrency or [1, 4]:
+                elapsed = measure({**target, 'concurrency': concurrency},
+                                  files)
+                print(f'{name:10} concurrency {concurrency:2} : '
+                      f'{elapsed:6.2f} s, {total / elapsed:8.1f} MB/s')
+    finally:
+        if server is not None:
+            server.shutdown()
+        shutil.rmtree(work)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Benchmark of the fleet reports, on synthetic fleets."""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                os.pardir, 'code'))
+
+from docker_info import ContainerInfos, HostInfos  # noqa: E402
+from reports import FleetTable  # noqa: E402
+
+
+def make_fleet(hosts: int, containers: int, seed: int) -> List[HostInfos]:
+    """
+    Return hosts with random containers, images, ports, volumes and routes.
+
+    :param hosts : number of hosts
+    :param containers : number of containers of each host
+    :param seed : seed of the random generator, for repeatable fleets
+    """
+    rand = random.Random(seed)
+    images = [f'registry.example.com/image{i}:latest' for i in range(200)]
+    fleet = []
+    for host_index in range(hosts):
+        host_containers = []
+        for index in range(containers):
+            cont = ContainerInfos(f'container{index}')
+            cont.image = rand.choice(images)
+            for _ in range(rand.randint(0, 2)):
+                cont.ports[f'{rand.randint(1, 9000)}/tcp'].add(
+                    str(rand.randint(1024, 1200)))
+            for _ in range(rand.randint(0, 2)):
+                cont.volumes[f'volume{rand.randint(0, containers)}'].add(
+                    '/data')
+            if rand.random() < 0.3:
+                cont.url = f'Host:app{index}.host{host_index}.example.com'
+            host_containers.append(cont)
+        fleet.append(HostInfos(f'host{host_index}', f'Host {host_index}',
+                               host_containers))
+    return fleet
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-H', '--hosts',
+                        help='number of hosts of each fleet (repeatable)',
+                        type=int,
+                        action='append')
+    parser.add_argument('-c', '--containers',
+                        help='number of containers of each host',
+                        type=int,
+                        default=50)
+    parser.add_argument('-n', '--runs',
+                        help='number of runs, the best one is reported',
+                        type=int,
+                        default=5)
+    args = parser.parse_args()
+
+    for hosts in args.hosts or [10, 100, 1000]:
+        fleet = make_fleet(hosts, args.containers, seed=hosts)
+        build, report = [], []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            table = FleetTable(fleet, {})
+            build.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            table.report()
+            report.append(time.perf_counter() - start)
+        print(f'{hosts:5} hosts, {len(table):7} containers : '
+              f'table {min(build) * 1000:8.1f} ms, '
+              f'reports {min(report) * 1000:8.1f} ms')
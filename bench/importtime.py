@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Benchmark of the startup time of DGB, with python -X importtime."""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+from typing import Dict, List, Tuple
+
+# Directory of the modules of DGB
+CODE_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                         os.pardir, 'code')
+
+
+def import_times(statement: str,
+                 code_path: str) -> Tuple[int, Dict[str, int]]:
+    """
+    Run a statement in a new interpreter and return its import times.
+
+    Return the total import time and the cumulative time of each
+    module, in microseconds.
+
+    :param statement : Python statement importing modules
+    :param code_path : directory of the modules
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        cwd=code_path, capture_output=True, text=True, check=True)
+    modules: Dict[str, int] = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)
+        # Top-level imports are not indented
+        if not name.startswith('  '):
+            total += int(cumulative)
+    return total, modules
+
+
+def benchmark(statement: str,
+              code_path: str,
+              runs: int,
+              top: int) -> List[str]:
+    """
+    Return a report of the import time of a statement.
+
+    :param statement : Python statement importing modules
+    :param code_path : directory of the modules
+    :param runs : number of runs, the median is reported
+    :param top : number of slowest modules to list
+    """
+    samples = [import_times(statement, code_path) for _ in range(runs)]
+    lines = [f"{statement} : "
+             f"{statistics.median(t for t, _ in samples) / 1000:.1f} ms"]
+    slowest = sorted(samples[0][1],
+                     key=lambda m: -statistics.median(s[1].get(m, 0)
+                                                      for s in samples))
+    for module in slowest[:top]:
+        median = statistics.median(s[1].get(module, 0) for s in samples)
+        lines.append(f'    {module.strip():40} {median / 1000:8.1f} ms')
+    return lines
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('statements',
+                        help='statements to time, run from the code '
+                             'directory',
+                        nargs='*',
+                        default=['import render',
+                                 'import render, actions; '
+                                 'actions.load_action("directory")',
+                                 'import render, actions; '
+                                 'actions.load_action("sftp")'])
+    parser.add_argument('-d', '--code-directory',
+                        help='directory of the modules, e.g. of another '
+                             'checkout to compare with',
+                        default=CODE_PATH)
+    parser.add_argument('-n', '--runs',
+                        help='number of runs of each statement',
+                        type=int,
+                        default=10)
+    parser.add_argument('-t', '--top',
+                        help='number of slowest modules to list',
+                        type=int,
+                        default=5)
+    args = parser.parse_args()
+    for statement in args.statements:
+        print('\n'.join(benchmark(statement, args.code_directory, args.runs,
+                                   args.top)))
@@ -1,120 +1,230 @@
 #!/usr/bin/env python
 # coding=utf-8
 """Logic for performing actions on files after their generation."""
+import abc
+import asyncio
+import contextlib
+import functools
+import hashlib
+import importlib
 import os
 import logging
-from typing import List
+import re
+import time
+from typing import Any, Callable, ContextManager, Dict, List, Set
+
+# Class performing each type of action, as "module:class". Each backend
+# has its own module, only imported when an action of its type is
+# configured, as their dependencies (paramiko, webdav, boto3...) are
+# slow to import.
+ACTIONS = {
+    'webdav': 'actions_webdav:WebDAVUploader',
+    'sftp': 'actions_sftp:SFTPUploader',
+    'directory': 'actions_directory:DirectoryCopier',
+    's3': 'actions_s3:S3Uploader'
+}
+# Default size of the pieces of files read and sent at once, in bytes
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+# Default number of files sent at the same time by an action
+DEFAULT_CONCURRENCY = 1
+# Default number of times an interrupted upload is resumed in a run
+DEFAULT_RETRIES = 3
+# Delay before resuming an interrupted upload, times the attempt, in seconds
+RETRY_DELAY = 1
+
+
+def load_action(action_type: str) -> type:
+    """
+    Import and return the class performing a type of action.
+
+    :param action_type : type of the action, as in the configuration
+    """
+    module_name, class_name = ACTIONS[action_type].split(':')
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def part_name(path: str) -> str:
+    """
+    Return the name of the partial remote copy of a file.
+
+    The name depends on the content of the file, so that an upload is
+    only resumed with the same version of the file, even if the file was
+    written again since, as each run renders all files again.
+
+    :param path : path of the local file
+    """
+    stat = os.stat(path)
+    digest = file_digest(path, stat.st_size, stat.st_mtime_ns)
+    return f'{os.path.basename(path)}.{digest}.part'
+
+
+@functools.lru_cache(maxsize=1024)
+def file_digest(path: str, size: int, mtime_ns: int) -> str:
+    """
+    Return a short hash of the content of a file, read in chunks.
+
+    The size and modification time are only part of the cache key, so
+    that a file is hashed again when it is written again.
+
+    :param path : path of the local file
+    :param size : size of the file
+    :param mtime_ns : modification time of the file, in nanoseconds
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(DEFAULT_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def is_stale_part(name: str, files: List[str]) -> bool:
+    """
+    Check if a remote file is a partial copy of an older version of files.
+
+    :param name : name of the remote file
+    :param files : paths of the local files being uploaded
+    """
+    return any(
+        re.fullmatch(rf'{re.escape(os.path.basename(f))}\.[0-9a-f-]+\.part',
+                     name) and name != part_name(f)
+        for f in files)
 
-import paramiko
 
-import webdav.client as wc
-from webdav.client import WebDavException
+def log_throughput(target: str, sent: int, elapsed: float):
+    """
+    Log the amount of data sent to a target and the throughput.
+
+    :param target : name of the target
+    :param sent : number of bytes sent
+    :param elapsed : duration of the upload, in seconds
+    """
+    logging.info('Sent %d bytes to %s in %.2f seconds (%.2f MB/s)',
+                 sent, target, elapsed,
+                 sent / max(elapsed, 1e-6) / 1024 / 1024)
 
 
-class WebDAVUploader:
-    """This class performs upload to a WebDAV compatible server."""
+class Action(abc.ABC):
+    """
+    Base class of actions, performed on the generated files.
+
+    An action goes through three asynchronous steps, run by GraphBot :
+    * prepare() : connect to the target, create folders...
+    * upload(files) : send the files, "concurrency" files at a time
+    * close() : release connections, even if a step failed
+
+    Constructors must not connect to anything, so that actions can be
+    built, and checked, without their target. Subclasses implement
+    put() to send a single file, and may extend the three steps. Slow
+    and blocking calls are run in threads with call().
+
+    All steps must end within "timeout" seconds, if set. A thread cannot
+    be interrupted, so that subclasses also give this timeout to their
+    clients (connection, reads...), and close() is only called once all
+    threads ended, see wait_calls().
+    """
 
     def __init__(self,
-                 hostname: str,
-                 login: str,
-                 password: str,
-                 remote_path: str):
+                 target: str,
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 timeout: float = None):
         """
-        Build an instance with credentials.
+        Initialize an action.
 
-        :param hostname : WebDAV link
-        :param login : username
-        :param password : password of the user
-        :param remote_path : remote path where to store the files
+        :param target : name of the target, for logs
+        :param concurrency : number of files sent at the same time
+        :param timeout : time given to the action, in seconds
         """
-        options = {
-            'webdav_hostname': hostname,
-            'webdav_login': login,
-            'webdav_password': password,
-        }
-        self.__remote_path = remote_path
-        self.__client = wc.Client(options)
-
-    def upload(self, files: List[str]):
+        self.target = target
+        self.concurrency = concurrency
+        self.timeout = timeout
+        # Context wrapping blocking calls, e.g. to profile them
+        self.stage: Callable[[], ContextManager] = contextlib.nullcontext
+        # Blocking calls running in threads
+        self.__calls: Set[asyncio.Future] = set()
+
+    @staticmethod
+    def settings(action: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Upload files to the WebDAV server.
+        Return settings common to all actions, from their configuration.
 
-        :param files: Paths to the files to upload
+        :param action : configuration of the action
         """
-        logging.info('Starting upload of %s', files)
-        # Create remote folder if it does not exists
-        if not self.__client.check(self.__remote_path):
-            self.__client.mkdir(self.__remote_path)
-
-        for file in files:
-            filename = os.path.basename(file)
-            try:
-                self.__client.upload_sync(
-                    remote_path=f'{self.__remote_path}/{filename}',
-                    local_path=file)
-                logging.info("File %s successfully uploaded!", filename)
-            except WebDavException as e:
-                logging.error('Error uploading file %s', file)
-                logging.exception(e)
-        logging.info('Finished upload')
+        return {
+            'concurrency': action.get('concurrency', DEFAULT_CONCURRENCY),
+            'timeout': action.get('timeout')
+        }
 
+    @classmethod
+    @abc.abstractmethod
+    def from_config(cls, action: Dict[str, Any]) -> 'Action':
+        """
+        Build an instance from an action of the configuration.
 
-class SFTPUploader:
-    """
-    This class performs uploads to a SFTP server.
+        :param action : configuration of the action
+        """
 
-    Currently only connection via user/password is supported.
-    """
-    def __init__(self,
-                 hostname: str,
-                 port: int,
-                 login: str,
-                 password: str,
-                 base_path: str = ''):
+    async def call(self, function: Callable, *args: Any) -> Any:
         """
-        Build an instance with credentials.
+        Run a blocking function in a thread and return its result.
 
-        :param hostname public URL
-        :param port:       SFTP port
-        :param login:      username
-        :param password:   cleartext password
-        :param base_path:  directory for uploads
+        :param function : function to run
+        :param args : arguments of the function
         """
-        self.__dir = base_path
-
-        transport = paramiko.Transport((hostname, port))
-        try:
-            transport.connect(None, login, password)
-            self.__client = paramiko.SFTPClient.from_transport(transport)
-        except paramiko.ssh_exception.SSHException as e:
-            logging.error("Error creating SFTP client for %s", hostname)
-            logging.exception(e)
-
-        # Create the directory if it does not exists
-        try:
-            self.__client.listdir(base_path)
-            info = "Folder %s already existing on %s, skipping creation..."
-            logging.info(info, hostname, base_path)
-        except FileNotFoundError:
-            self.__client.mkdir(base_path)
-
-    def upload(self, files: List[str]):
+        def run():
+            with self.stage():
+                return function(*args)
+        call = asyncio.ensure_future(asyncio.to_thread(run))
+        self.__calls.add(call)
+        call.add_done_callback(self.__calls.discard)
+        # If the action is cancelled, the thread still runs until its
+        # client times out, and wait_calls() waits for it
+        return await asyncio.shield(call)
+
+    async def wait_calls(self):
+        """Wait for the end of the blocking calls still running."""
+        if self.__calls:
+            logging.info('Waiting for %d calls to %s to end.',
+                         len(self.__calls), self.target)
+            await asyncio.wait(set(self.__calls))
+
+    async def prepare(self):
+        """Get ready to upload files, e.g. connect to the target."""
+
+    async def upload(self, files: List[str]):
         """
-        Upload files to the STFP server.
+        Send files, a few at a time, and log the throughput.
 
-        :param files: Paths of files to upload
+        A file which cannot be sent is logged and skipped.
+
+        :param files : paths of the files to send
         """
         logging.info('Starting upload of %s', files)
-        for file in files:
-            filename = os.path.basename(file)
-            try:
-                self.__client.put(file, f'{self.__dir}/{filename}')
-                logging.info("File %s successfully uploaded!", filename)
-            except Exception as e:
-                logging.error('Error uploading file %s', file)
-                logging.exception(e)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(file: str) -> int:
+            async with semaphore:
+                try:
+                    sent = await self.call(self.put, file)
+                    logging.info("File %s successfully uploaded!",
+                                 os.path.basename(file))
+                    return sent
+                except Exception as e:
+                    logging.error('Error uploading file %s', file)
+                    logging.exception(e)
+                    return 0
+
+        start = time.monotonic()
+        sent = await asyncio.gather(*[send(file) for file in files])
+        log_throughput(self.target, sum(sent), time.monotonic() - start)
         logging.info('Finished upload')
 
-    def __del__(self):
-        """Close the SSH connection."""
-        self.__client.close()
+    @abc.abstractmethod
+    def put(self, file: str) -> int:
+        """
+        Send a file and return the number of bytes sent. Blocking.
+
+        :param file : path of the file to send
+        """
+
+    async def close(self):
+        """Release the resources used to upload files."""
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Action copying files to a local directory."""
+import os
+import shutil
+from typing import Any, Dict
+
+from actions import Action
+
+
+class DirectoryCopier(Action):
+    """
+    This class copies files to a local directory.
+
+    The directory may be a mount point of a network share, or be served
+    by a web server. Files are copied to a partial copy which replaces
+    the previous file once complete, so that readers never get a
+    truncated file.
+    """
+
+    def __init__(self, path: str, **settings: Any):
+        """
+        Build an instance with its directory.
+
+        :param path : directory where to copy the files
+        :param settings : settings common to all actions
+        """
+        super().__init__(path, **settings)
+        self.path = path
+
+    @classmethod
+    def from_config(cls, action: Dict[str, Any]) -> 'DirectoryCopier':
+        """
+        Build an instance from an action of the configuration.
+
+        :param action : configuration of the action
+        """
+        return cls(action['path'], **cls.settings(action))
+
+    async def prepare(self):
+        """Create the directory if it does not exist."""
+        await self.call(os.makedirs, self.path, 0o755, True)
+
+    def put(self, file: str) -> int:
+        """
+        Copy a file and return the number of bytes copied.
+
+        :param file : path of the file to copy
+        """
+        destination = os.path.join(self.path, os.path.basename(file))
+        shutil.copyfile(file, f'{destination}.part')
+        os.replace(f'{destination}.part', destination)
+        return os.path.getsize(destination)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Action uploading files to an S3 compatible object store."""
+import os
+from typing import Any, Dict
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+from actions import DEFAULT_CHUNK_SIZE, Action
+
+
+class S3Uploader(Action):
+    """
+    This class performs uploads to an S3 compatible object store.
+
+    Any S3 compatible store can be used with "endpoint_url" (e.g. MinIO,
+    Ceph, Garage). Large files are sent in parts, several at a time, by
+    boto3, and an object is only visible once all its parts are sent.
+    """
+
+    def __init__(self,
+                 bucket: str,
+                 prefix: str = '',
+                 endpoint_url: str = None,
+                 region: str = None,
+                 access_key: str = None,
+                 secret_key: str = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE * 8,
+                 **settings: Any):
+        """
+        Build an instance with credentials.
+
+        :param bucket : name of the bucket
+        :param prefix : prefix of the keys of the objects, e.g. a folder
+        :param endpoint_url : URL of the store, default to AWS S3
+        :param region : region of the bucket
+        :param access_key : access key, default to the boto3 lookup
+                            (environment, ~/.aws, instance role...)
+        :param secret_key : secret key, default to the boto3 lookup
+        :param chunk_size : size of the parts of large files
+        :param settings : settings common to all actions
+        """
+        super().__init__(f'{endpoint_url or "s3"}/{bucket}', **settings)
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.__endpoint_url = endpoint_url
+        self.__region = region
+        self.__access_key = access_key
+        self.__secret_key = secret_key
+        self.__client = None
+        self.__transfer = None
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def from_config(cls, action: Dict[str, Any]) -> 'S3Uploader':
+        """
+        Build an instance from an action of the configuration.
+
+        :param action : configuration of the action
+        """
+        return cls(
+            action['bucket'],
+            action.get('remote_path', ''),
+            action.get('endpoint_url'),
+            action.get('region'),
+            action.get('access_key'),
+            action.get('secret_key'),
+            action.get('chunk_size', DEFAULT_CHUNK_SIZE * 8),
+            **cls.settings(action)
+        )
+
+    async def prepare(self):
+        """Build the client, which only connects when sending files."""
+        await self.call(self.__connect)
+
+    def __connect(self):
+        """Build the S3 client and the transfer settings."""
+        self.__client = boto3.client(
+            's3',
+            endpoint_url=self.__endpoint_url,
+            region_name=self.__region,
+            aws_access_key_id=self.__access_key,
+            aws_secret_access_key=self.__secret_key,
+            # Bound each request by the timeout of the action
+            config=Config(connect_timeout=self.timeout,
+                          read_timeout=self.timeout)
+            if self.timeout is not None else None
+        )
+        self.__transfer = TransferConfig(
+            multipart_threshold=self.chunk_size,
+            multipart_chunksize=self.chunk_size)
+
+    def put(self, file: str) -> int:
+        """
+        Upload a file and return the number of bytes sent.
+
+        :param file : path of the file to upload
+        """
+        key = os.path.basename(file)
+        if self.prefix:
+            key = f'{self.prefix}/{key}'
+        self.__client.upload_file(file, self.bucket, key,
+                                  Config=self.__transfer)
+        return os.path.getsize(file)
+
+    async def close(self):
+        """Close the HTTP connections of the client."""
+        if self.__client is not None and hasattr(self.__client, 'close'):
+            self.__client.close()
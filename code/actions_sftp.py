@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Action uploading files to a SFTP server."""
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Any, Dict, List
+
+import paramiko
+
+from actions import DEFAULT_CHUNK_SIZE, DEFAULT_RETRIES, RETRY_DELAY, \
+    Action, is_stale_part, part_name
+
+
+class SFTPUploader(Action):
+    """
+    This class performs uploads to a SFTP server.
+
+    Currently only connection via user/password is supported.
+
+    Files are written in chunks to a partial copy which is renamed once
+    complete. Writes are pipelined, i.e. chunks are sent without waiting
+    for the acknowledgement of the previous ones, and the SSH window can
+    be enlarged for links with a high latency. An interrupted upload is
+    resumed from the size of the partial copy, within the run on a new
+    connection if needed, or on the next run.
+    """
+    def __init__(self,
+                 hostname: str,
+                 port: int,
+                 login: str,
+                 password: str,
+                 base_path: str = '',
+                 window_size: int = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 retries: int = DEFAULT_RETRIES,
+                 **settings: Any):
+        """
+        Build an instance with credentials.
+
+        :param hostname public URL
+        :param port:       SFTP port
+        :param login:      username
+        :param password:   cleartext password
+        :param base_path:  directory for uploads
+        :param window_size: SSH window size, default to paramiko's one
+        :param chunk_size: size of the pieces of files written at once
+        :param retries:    number of times an upload is resumed in a run
+        :param settings:   settings common to all actions
+        """
+        super().__init__(hostname, **settings)
+        self.__dir = base_path
+        self.__hostname = hostname
+        self.__port = port
+        self.__login = login
+        self.__password = password
+        self.__window_size = window_size
+        self.__transport = None
+        self.__client = None
+        # Only one upload connects again when the connection is lost
+        self.__lock = threading.Lock()
+        self.chunk_size = chunk_size
+        self.retries = retries
+
+    @classmethod
+    def from_config(cls, action: Dict[str, Any]) -> 'SFTPUploader':
+        """
+        Build an instance from an action of the configuration.
+
+        :param action : configuration of the action
+        """
+        return cls(
+            action['hostname'],
+            action['port'],
+            action['login'],
+            action['password'],
+            action['remote_path'],
+            action.get('window_size'),
+            action.get('chunk_size', DEFAULT_CHUNK_SIZE),
+            action.get('retries', DEFAULT_RETRIES),
+            **cls.settings(action)
+        )
+
+    async def prepare(self):
+        """Connect to the server and create the directory if needed."""
+        await self.call(self.__connect)
+
+    async def upload(self, files: List[str]):
+        """
+        Upload files to the STFP server.
+
+        :param files: Paths of files to upload
+        """
+        # Forget partial copies of older versions of the files
+        for name in await self.call(self.__client.listdir, self.__dir or '.'):
+            if is_stale_part(name, files):
+                await self.call(self.__client.remove, f'{self.__dir}/{name}')
+        await super().upload(files)
+
+    async def close(self):
+        """Close the SSH connection."""
+        if self.__transport is not None:
+            self.__transport.close()
+
+    def __connect(self):
+        """Open the SFTP session and create the directory if needed."""
+        transport_args = {}
+        if self.__window_size is not None:
+            transport_args['default_window_size'] = self.__window_size
+        # Every blocking step is bounded by the timeout of the action
+        sock = socket.create_connection((self.__hostname, self.__port),
+                                        self.timeout)
+        self.__transport = paramiko.Transport(sock, **transport_args)
+        if self.timeout is not None:
+            self.__transport.banner_timeout = self.timeout
+            self.__transport.auth_timeout = self.timeout
+        try:
+            self.__transport.connect(None, self.__login, self.__password)
+            self.__client = \
+                paramiko.SFTPClient.from_transport(self.__transport)
+            self.__client.get_channel().settimeout(self.timeout)
+        except paramiko.ssh_exception.SSHException as e:
+            logging.error("Error creating SFTP client for %s",
+                          self.__hostname)
+            logging.exception(e)
+            raise
+
+        # Create the directory if it does not exists
+        try:
+            self.__client.listdir(self.__dir)
+            info = "Folder %s already existing on %s, skipping creation..."
+            logging.info(info, self.__hostname, self.__dir)
+        except FileNotFoundError:
+            self.__client.mkdir(self.__dir)
+
+    def __reconnect(self):
+        """Open a new SFTP session if the connection was lost."""
+        with self.__lock:
+            if self.__transport.is_active():
+                return
+            logging.info('Connection to %s lost, connecting again.',
+                         self.__hostname)
+            self.__transport.close()
+            self.__connect()
+
+    def put(self, file: str) -> int:
+        """
+        Upload a file, resuming a previous upload, and return bytes sent.
+
+        An interrupted upload is resumed up to "retries" times.
+
+        :param file : path of the local file
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                return self.__put(file)
+            except (IOError, EOFError, paramiko.SSHException) as e:
+                if attempt == self.retries:
+                    raise
+                logging.warning('Upload of %s interrupted (%s), resuming.',
+                                os.path.basename(file), e)
+                time.sleep(RETRY_DELAY * (attempt + 1))
+                self.__reconnect()
+
+    def __put(self, file: str) -> int:
+        """
+        Upload a file from the end of its partial copy, if any.
+
+        :param file : path of the local file
+        """
+        part = f'{self.__dir}/{part_name(file)}'
+        size = os.path.getsize(file)
+        try:
+            offset = self.__client.stat(part).st_size
+        except FileNotFoundError:
+            offset = 0
+        if offset > size:
+            offset = 0
+        if offset:
+            logging.info('Resuming upload of %s at byte %d', file, offset)
+
+        with open(file, 'rb') as source, \
+                self.__client.open(part, 'r+b' if offset else 'wb') as target:
+            target.set_pipelined(True)
+            source.seek(offset)
+            target.seek(offset)
+            while True:
+                chunk = source.read(self.chunk_size)
+                if not chunk:
+                    break
+                target.write(chunk)
+
+        destination = f'{self.__dir}/{os.path.basename(file)}'
+        try:
+            # Atomic replacement, with the OpenSSH extension
+            self.__client.posix_rename(part, destination)
+        except IOError:
+            try:
+                self.__client.remove(destination)
+            except FileNotFoundError:
+                pass
+            self.__client.rename(part, destination)
+        return size - offset
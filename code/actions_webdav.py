@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Action uploading files to a WebDAV server."""
+import logging
+import math
+import os
+import time
+from typing import Any, Dict, List, Tuple
+from urllib.parse import quote
+
+import requests
+import webdav.client as wc
+
+from actions import DEFAULT_CHUNK_SIZE, DEFAULT_RETRIES, RETRY_DELAY, \
+    Action, is_stale_part, part_name
+
+
+class WebDAVUploader(Action):
+    """
+    This class performs upload to a WebDAV compatible server.
+
+    Files are streamed from disk, a chunk at a time, to a partial copy
+    which is moved to its final name once complete. An interrupted
+    upload is resumed from the size of the partial copy with a ranged
+    PUT, within the run or on the next run, if the server supports it
+    (e.g. Apache mod_dav) and kept the partial copy. Otherwise, the
+    upload is restarted from the beginning.
+    """
+
+    def __init__(self,
+                 hostname: str,
+                 login: str,
+                 password: str,
+                 remote_path: str,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 retries: int = DEFAULT_RETRIES,
+                 **settings: Any):
+        """
+        Build an instance with credentials.
+
+        :param hostname : WebDAV link
+        :param login : username
+        :param password : password of the user
+        :param remote_path : remote path where to store the files
+        :param chunk_size : size of the pieces of files sent at once
+        :param retries : number of times an upload is resumed in a run
+        :param settings : settings common to all actions
+        """
+        super().__init__(hostname, **settings)
+        self.__hostname = hostname
+        self.__login = login
+        self.__password = password
+        self.__remote_path = remote_path
+        self.__client = None
+        self.__session = None
+        self.chunk_size = chunk_size
+        self.retries = retries
+
+    @classmethod
+    def from_config(cls, action: Dict[str, Any]) -> 'WebDAVUploader':
+        """
+        Build an instance from an action of the configuration.
+
+        :param action : configuration of the action
+        """
+        return cls(
+            action['hostname'],
+            action['login'],
+            action['password'],
+            action['remote_path'],
+            action.get('chunk_size', DEFAULT_CHUNK_SIZE),
+            action.get('retries', DEFAULT_RETRIES),
+            **cls.settings(action)
+        )
+
+    async def prepare(self):
+        """Create the remote folder if it does not exist."""
+        await self.call(self.__connect)
+
+    async def upload(self, files: List[str]):
+        """
+        Upload files to the WebDAV server.
+
+        :param files: Paths to the files to upload
+        """
+        # Forget partial copies of older versions of the files
+        for name in await self.call(self.__client.list, self.__remote_path):
+            if is_stale_part(name, files):
+                await self.call(self.__client.clean,
+                                f'{self.__remote_path}/{name}')
+        await super().upload(files)
+
+    async def close(self):
+        """Close the HTTP connections."""
+        if self.__session is not None:
+            self.__session.close()
+
+    def __connect(self):
+        """Build the clients and create the remote folder if needed."""
+        options = {
+            'webdav_hostname': self.__hostname,
+            'webdav_login': self.__login,
+            'webdav_password': self.__password,
+        }
+        self.__client = wc.Client(options)
+        if self.timeout is not None:
+            # Options of pycurl, in whole seconds
+            self.__client.default_options.update({
+                'CONNECTTIMEOUT': math.ceil(self.timeout),
+                'TIMEOUT': math.ceil(self.timeout)
+            })
+        self.__session = requests.Session()
+        self.__session.auth = (self.__login, self.__password)
+        # Create remote folder if it does not exists
+        if not self.__client.check(self.__remote_path):
+            self.__client.mkdir(self.__remote_path)
+
+    def put(self, file: str) -> int:
+        """
+        Upload a file, resuming a previous upload, and return bytes sent.
+
+        An interrupted upload is resumed up to "retries" times.
+
+        :param file : path of the local file
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                return self.__put(file)
+            except requests.RequestException as e:
+                if attempt == self.retries:
+                    raise
+                logging.warning('Upload of %s interrupted (%s), resuming.',
+                                os.path.basename(file), e)
+                time.sleep(RETRY_DELAY * (attempt + 1))
+
+    def __put(self, file: str) -> int:
+        """
+        Upload a file from the end of its partial copy, if any.
+
+        :param file : path of the local file
+        """
+        filename = os.path.basename(file)
+        part_url = self.__url(part_name(file))
+        size = os.path.getsize(file)
+        offset = self.__remote_size(part_url)
+        if offset > size:
+            offset = 0
+
+        sent, response = self.__put_from(file, part_url, offset, size)
+        if offset and (not response.ok
+                       or self.__remote_size(part_url) != size):
+            # Ranged PUT is not supported by all servers, some of them
+            # even replace the file with the range
+            logging.info('Cannot resume upload of %s, restarting.',
+                         filename)
+            sent, response = self.__put_from(file, part_url, 0, size)
+        response.raise_for_status()
+
+        response = self.__session.request(
+            'MOVE', part_url,
+            headers={'Destination': self.__url(filename), 'Overwrite': 'T'},
+            timeout=self.timeout)
+        response.raise_for_status()
+        return sent
+
+    def __remote_size(self, url: str) -> int:
+        """
+        Return the size of a remote file, 0 if it does not exist.
+
+        :param url : URL of the remote file
+        """
+        response = self.__session.head(url, timeout=self.timeout)
+        if not response.ok:
+            return 0
+        return int(response.headers.get('Content-Length', 0))
+
+    def __put_from(self,
+                   file: str,
+                   url: str,
+                   offset: int,
+                   size: int) -> Tuple[int, Any]:
+        """
+        Send the end of a file, from an offset, and return bytes sent.
+
+        The file object is given to requests, which sends it in blocks,
+        so that only a block of the file is in memory at once.
+
+        :param file : path of the local file
+        :param url : URL of the partial remote copy
+        :param offset : number of bytes already uploaded
+        :param size : size of the local file
+        """
+        headers = {}
+        if offset:
+            logging.info('Resuming upload of %s at byte %d', file, offset)
+            headers['Content-Range'] = f'bytes {offset}-{size - 1}/{size}'
+        with open(file, 'rb', buffering=self.chunk_size) as source:
+            source.seek(offset)
+            response = self.__session.put(url, data=source, headers=headers,
+                                          timeout=self.timeout)
+        return size - offset, response
+
+    def __url(self, filename: str) -> str:
+        """
+        Return the URL of a file in the remote folder.
+
+        :param filename : name of the remote file
+        """
+        return f"{self.__hostname.rstrip('/')}/" \
+               f"{quote(self.__remote_path.strip('/'))}/{quote(filename)}"
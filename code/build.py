@@ -3,14 +3,13 @@
 """Logic to build a graph representing the Docker architecture of host."""
 from collections import defaultdict
 from enum import Enum
-from typing import List, Dict, Set
+from typing import List, Dict, Optional, Set
 
 import logging
 
-import docker
 from graphviz import Digraph
 
-from docker_info import DockerInfo, ContainerInfos
+from docker_info import ContainerInfos, HostInfos
 
 
 class GraphElement(Enum):
@@ -33,6 +32,20 @@ class GraphElement(Enum):
     MOUNT_POINT = 'Directory mounted in a container'
 
 
+def node_name(name: str, host_name: str, subname: str = None) -> str:
+    """
+    Return an unique name for a node or subnode of a host graph.
+
+    :param name : name of the node
+    :param host_name : name of the host owning the node
+    :param subname : name of the subnode (<X> in the record node label)
+    """
+    name = f'{name}_{host_name}'
+    if subname is not None:
+        name += f':{subname}'
+    return name
+
+
 class GraphBuilder:
     """
     Construct a graph showing containers, images and ports on a Docker install.
@@ -48,30 +61,33 @@ class GraphBuilder:
         return self.__graph
 
     def __init__(self,
-                 docker_client: docker.DockerClient,
+                 host: HostInfos,
                  color_scheme: Dict[str, str],
-                 host_name: str,
-                 host_label: str,
                  exclude: List[str] = None,
                  hide: List[str] = None,
-                 default_network: str = None):
+                 default_network: str = None,
+                 timestamp: bool = True):
         """
         Initialize a graph builder.
 
-        :param docker_client : docker client used to build the graph
+        :param host : collected state of the host to draw
         :param color_scheme : colors used for the graph
-        :param host_name : name of the host
-        :param host_label : label to put on the host graph
         :param exclude : name of containers to exclude of the layout
         :param hide : elements to hide (volumes, binds and/or urls)
         :param default_network : network with lower priority if multiple
+        :param timestamp : add the date of the collection to the label
         """
         self.color_scheme = color_scheme
-        self.docker_client = docker_client
-        self.host_label = host_label
-        self.host_name = host_name
+        self.host = host
+        self.host_label = host.label
+        if timestamp:
+            date = host.collected_at.strftime("%m/%d/%Y %H:%M")
+            self.host_label += f' at {date}'
+        self.host_name = host.name
         self.exclude = exclude if exclude is not None else []
         self.default_network = default_network
+        # Containers drawn on the graph, filled when building it
+        self.containers: List[ContainerInfos] = []
 
         # Individual variables for hiding elements
         hide = hide if hide is not None else []
@@ -98,13 +114,17 @@ class GraphBuilder:
         via the __graph property.
         """
         # Get all needed informations about running containers
-        docker_info = DockerInfo(self.docker_client)
-        running = docker_info.containers
-        self.__traefik_container = docker_info.traefik_container
-        self.__traefik_source_port = docker_info.traefik_source_port
+        running = self.host.containers
+        self.__traefik_container = self.host.traefik_container
+        self.__traefik_source_port = self.host.traefik_source_port
 
         # Ignore containers excluded in configuration
-        running = [x for x in running if x.name not in self.exclude]
+        # Always walk containers in the same order, so that the same
+        # state always gives the same DOT source
+        running = sorted(
+            (x for x in running if x.name not in self.exclude),
+            key=lambda x: x.name)
+        self.containers = running
 
         # Create a subgraph for the host
         # This is necessary to get a nice colored box for the host
@@ -126,8 +146,8 @@ class GraphBuilder:
         The containers are grouped by networks.
 
         WARNING : if a container is in multiple networks,
-        it will only be part of this first network on the
-        representation. This is the consequence of grouping
+        it will only be part of the first network (by name) on
+        the representation. This is the consequence of grouping
         by network.
 
         :param parent Parent graph to create networks subgraph
@@ -138,21 +158,22 @@ class GraphBuilder:
         # Group containers by networks
         network_dict = defaultdict(list)
         for cont in running:
-            if self.default_network in cont.networks \
-                    and len(cont.networks) > 1:
-                cont.networks.remove(self.default_network)
+            # Do not alter the container, it may be drawn again later
+            networks = set(cont.networks)
+            if self.default_network in networks and len(networks) > 1:
+                networks.remove(self.default_network)
                 warn = 'Container %s belongs to more than one network, ' \
                        'including default network %s : ignore it. '
                 logging.warning(warn, cont.name, self.default_network)
 
-            network = list(cont.networks)[0]
-            if len(cont.networks) > 1:
+            network = sorted(networks)[0]
+            if len(networks) > 1:
                 warn = 'Container %s belongs to multiple networks, choose %s.'
                 logging.warning(warn, cont.name, network)
             network_dict[network].append(cont)
 
         # Create a subgraph for each network
-        for network, containers in network_dict.items():
+        for network, containers in sorted(network_dict.items()):
             network_subgraph = Digraph(f'cluster_{self.__node_name(network)}')
             network_subgraph.attr(
                 label=network,
@@ -173,8 +194,11 @@ class GraphBuilder:
                 # Create a simple node for the container
                 image_subgraph.node(
                     name=self.__node_name(cont.name),
-                    label=self.__record_label(cont.name, list(cont.ports)),
-                    **self.__get_style(GraphElement.CONTAINER)
+                    label=self.__record_label(
+                        cont.name,
+                        sorted(cont.ports),
+                        self.__stats_label(cont.stats)),
+                    **self.__get_container_style(cont)
                 )
 
                 # Add volumes
@@ -233,7 +257,7 @@ class GraphBuilder:
                 )
 
             # Add one edge for each link between containers
-            for link in cont.links:
+            for link in sorted(cont.links):
                 self.__graph.edge(
                     tail_name=self.__node_name(cont.name, cont.name),
                     head_name=self.__node_name(link, link),
@@ -254,8 +278,8 @@ class GraphBuilder:
         :param running Running containers
         """
         for cont in running:
-            for exposed_port, host_ports in cont.ports.items():
-                for port in host_ports:
+            for exposed_port, host_ports in sorted(cont.ports.items()):
+                for port in sorted(host_ports):
                     self.__graph.node(
                         self.__node_name(port),
                         port,
@@ -287,7 +311,7 @@ class GraphBuilder:
         :param source_parent Subgraph for Docker volumes and host folders
         :param volumes Source folder or Docker volumes and mount points
         """
-        for source, dests in volumes.items():
+        for source, dests in sorted(volumes.items()):
             # Cut name if too long
             label = source[:20] + '...' if len(source) > 20 else source
             source_parent.node(
@@ -296,7 +320,7 @@ class GraphBuilder:
                 label=label,
                 **self.__get_style(GraphElement.VOLUME)
             )
-            for dest in dests:
+            for dest in sorted(dests):
                 cont_parent.node(
                     # Prevent mount point duplicates, add container name
                     name=self.__node_name(dest + cont.name),
@@ -381,6 +405,61 @@ class GraphBuilder:
             raise Exception('Unkown graph element')
         return style
 
+    def __get_container_style(self, cont: ContainerInfos) -> Dict[str, str]:
+        """
+        Return the style of a container, showing its resource usage.
+
+        The more CPU the container uses, the closer its color is to the
+        "hot" color. The more memory it uses, the thicker its border is.
+
+        :param cont : container to style
+        """
+        style = self.__get_style(GraphElement.CONTAINER)
+        if cont.stats is None:
+            return style
+        heat = min(cont.stats['cpu_percent'] / 100, 1)
+        style['fillcolor'] = self.__blend(
+            self.color_scheme['container'],
+            self.color_scheme.get('hot', '#e0245e'),
+            heat)
+        if heat > 0.5:
+            style['fontcolor'] = self.color_scheme['bright_text']
+        if cont.stats['memory_limit']:
+            memory = cont.stats['memory_usage'] / cont.stats['memory_limit']
+            style['penwidth'] = f'{1 + 3 * min(memory, 1):.1f}'
+        return style
+
+    @staticmethod
+    def __stats_label(stats: Dict[str, float] = None) -> Optional[str]:
+        """
+        Return a short text summarizing resource usage of a container.
+
+        :param stats : resource usage of the container, if sampled
+        """
+        if stats is None:
+            return None
+        mib = 1024 * 1024
+        return f"CPU {stats['cpu_percent']:.0f}% - " \
+               f"RAM {stats['memory_usage'] / mib:.0f} MiB - " \
+               f"Net {stats['network_rx'] / mib:.0f}/" \
+               f"{stats['network_tx'] / mib:.0f} MiB"
+
+    @staticmethod
+    def __blend(color: str, other: str, ratio: float) -> str:
+        """
+        Return the color between two hexadecimal colors at a given ratio.
+
+        :param color : color for a ratio of 0
+        :param other : color for a ratio of 1
+        :param ratio : position between the two colors
+        """
+        channels = [
+            round(int(color[i:i + 2], 16) * (1 - ratio)
+                  + int(other[i:i + 2], 16) * ratio)
+            for i in (1, 3, 5)
+        ]
+        return '#' + ''.join(f'{c:02x}' for c in channels)
+
     def __node_name(self, name: str, subname: str = None) -> str:
         """
         Return an unique name for a node or subnode.
@@ -396,13 +475,12 @@ class GraphBuilder:
         :param name : name of the node
         :param subname : name of the subnode (<X> in the record node label)
         """
-        name = f'{name}_{self.host_name}'
-        if subname is not None:
-            name += f':{subname}'
-        return name
+        return node_name(name, self.host_name, subname)
 
     @staticmethod
-    def __record_label(name: str, ports: List[str]) -> str:
+    def __record_label(name: str,
+                       ports: List[str],
+                       details: str = None) -> str:
         """
         Return a label for a record node (name of container and ports).
 
@@ -419,11 +497,15 @@ class GraphBuilder:
 
         :param name : name of the container
         :param port : ports exposed by the container
+        :param details : additional line under the name of the container
         """
         # As the global label will already be unique,
         # no need to use __node_name here
         # Double-bracket = single bracket in f-string
-        label = f'{{ <{name}> {name} }}'
+        if details is not None:
+            label = f'{{ <{name}> {name}\\n{details} }}'
+        else:
+            label = f'{{ <{name}> {name} }}'
         if ports:
             label += ' | { '
             for port in ports:
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Logic to keep the last good collected state of each host."""
+
+import copy
+import logging
+import os
+
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from docker_info import HostInfos
+from snapshot import save_snapshot, load_snapshots
+
+
+class HostCache:
+    """
+    Remember the last state successfully collected from each host.
+
+    States are kept in memory and in the snapshots of the output
+    directory, so that they survive between two runs. Snapshots are
+    only read when a state is first needed, as most runs never use
+    the cache. A cached state is only returned if it is not older than
+    the maximum age.
+    """
+
+    def __init__(self, output_path: str, max_age: float = None):
+        """
+        Initialize the cache, without reading snapshots yet.
+
+        :param output_path : output directory
+        :param max_age : maximum age of a cached state in seconds, if any
+        """
+        self.__output_path = output_path
+        self.max_age = max_age
+        # States collected since the cache was built
+        self.__hosts: Dict[str, HostInfos] = {}
+        # States of the snapshots, read on first use
+        self.__snapshots: Optional[Dict[str, HostInfos]] = None
+
+    def store(self, host: HostInfos):
+        """
+        Remember a freshly collected state and write its snapshot.
+
+        :param host : collected state of the host
+        """
+        self.__hosts[host.name] = host
+        save_snapshot(self.__output_path, host)
+
+    def get(self, host_name: str) -> Optional[HostInfos]:
+        """
+        Return the last state of a host, marked as stale, if still valid.
+
+        :param host_name : name of the host, as in the configuration
+        """
+        host = self.__hosts.get(host_name)
+        if host is None:
+            if self.__snapshots is None:
+                self.__snapshots = load_snapshots(self.__output_path) \
+                    if os.path.isdir(self.__output_path) else {}
+            host = self.__snapshots.get(host_name)
+        if host is None:
+            return None
+        age = datetime.now() - host.collected_at
+        if self.max_age is not None \
+                and age > timedelta(seconds=self.max_age):
+            logging.warning('Cached state of %s is too old (%s), drop it.',
+                            host_name, age)
+            return None
+        stale = copy.copy(host)
+        stale.stale = True
+        stale.label = f'{host.label} - STALE'
+        return stale
@@ -5,11 +5,36 @@
 import logging
 import argparse
 
+from datetime import datetime
+
+from profiler import Profiler
 from render import GraphBot
 
+
+def shard(value: str):
+    """Parse a shard specification such as 2/4 in an (index, count) pair."""
+    try:
+        index, count = (int(x) for x in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'{value} is not in i/N format')
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f'{value} : i must be in [1, N]')
+    return index, count
+
+
 if __name__ == '__main__':
     # Get command line arguments
     parser = argparse.ArgumentParser()
+    parser.add_argument('command',
+                        help='build graphs from hosts once, refresh them '
+                             'on schedule, serve them over HTTP while '
+                             'refreshing them on schedule, merge the '
+                             'snapshots written by shards, or render a '
+                             'host from its history',
+                        nargs='?',
+                        choices=['build', 'schedule', 'serve', 'merge',
+                                 'history'],
+                        default='build')
     parser.add_argument('-o', '--output-directory',
                         help='path for output directory of DOT and PNG files')
     parser.add_argument('-c', '--config-file',
@@ -21,6 +46,24 @@ if __name__ == '__main__':
                         choices=['debug', 'info', 'warning', 'error'],
                         # Allow upper or lowercase for loglevel
                         type=str.lower)
+    parser.add_argument('-s', '--shard',
+                        help='only build the i-th subset of hosts out of N',
+                        metavar='i/N',
+                        type=shard)
+    parser.add_argument('-i', '--input-directory',
+                        help='output directory of a shard to merge '
+                             '(repeatable, default to output directory)',
+                        action='append')
+    parser.add_argument('--host',
+                        help='host to render from its history')
+    parser.add_argument('--at',
+                        help='time of the state to render from history, '
+                             'e.g. 2021-06-01T12:00 (default to now)',
+                        type=datetime.fromisoformat)
+    parser.add_argument('-p', '--profile',
+                        help='profile each stage and write statistics in '
+                             'the profile sub-directory of output directory',
+                        action='store_true')
     args = parser.parse_args()
     if args.log_level is None:
         args.log_level = 'INFO'
@@ -47,8 +90,57 @@ if __name__ == '__main__':
 
     logging.debug('Starting GraphBot')
 
+    if args.input_directory is None:
+        args.input_directory = [args.output_directory]
+
+    profiler = None
+    if args.profile:
+        profiler = Profiler(args.output_directory)
+
     bot = GraphBot(args.config_file,
                    args.output_directory,
-                   args.certs_directory)
-    bot.build()
+                   args.certs_directory,
+                   args.shard,
+                   profiler)
+    if profiler is not None:
+        # Write profiles of each rendering, including its actions
+        bot.add_listener(lambda files: profiler.write())
+    if args.command == 'merge':
+        bot.merge(args.input_directory)
+    elif args.command == 'history':
+        if args.host is None:
+            parser.error('the history command requires --host')
+        bot.replay(args.host, args.at or datetime.now())
+        if profiler is not None:
+            # Replays do not notify listeners, as no action is performed
+            profiler.write()
+    elif args.command == 'schedule':
+        # Only import scheduling logic when needed
+        from scheduler import Scheduler
+        try:
+            Scheduler(bot).run()
+        except KeyboardInterrupt:
+            logging.info('Scheduler interrupted')
+    elif args.command == 'serve':
+        # Only import serving logic when needed
+        import threading
+        from scheduler import Scheduler
+        from server import GraphServer
+        server_config = bot.config.get('server', {})
+        server = GraphServer(bot,
+                             server_config.get('bind', '127.0.0.1'),
+                             server_config.get('port', 8080))
+        bot.build()
+        scheduler = Scheduler(bot, built=True)
+        threading.Thread(target=scheduler.run, daemon=True).start()
+        logging.info('Serving on http://%s:%d', *server.server_address[:2])
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logging.info('Server interrupted')
+        finally:
+            scheduler.stop()
+            server.server_close()
+    else:
+        bot.build()
     logging.debug('Stopping GraphBot')
@@ -13,11 +13,18 @@ import logging
 import re
 
 from collections import defaultdict
-from typing import Set, List, Dict, Optional
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Set, List, Dict, Optional
 
-import docker
+if TYPE_CHECKING:
+    import docker
+    from stats import StatsCollector
 
 TRAEFIK_DEFAULT_PORT = '80/tcp'
+# Address and port of another service in an environment variable value,
+# e.g. db.example.com:5432 or postgres://user@10.0.0.2:5432/db
+ENDPOINT_REGEX = re.compile(r'(?:^|[/@=,;\s])([a-zA-Z0-9][a-zA-Z0-9.-]*):'
+                            r'(\d{1,5})(?![\d.])')
 
 
 class ContainerInfos:
@@ -39,6 +46,11 @@ class ContainerInfos:
         self.networks: Set[str]
         self.networks = set()
 
+        # Docker identifier of each network, shared by all hosts
+        # of an overlay network
+        self.network_ids: Dict[str, str]
+        self.network_ids = dict()
+
         self.links: Set[str]
         self.links = set()
 
@@ -50,6 +62,15 @@ class ContainerInfos:
         self.volumes: Dict[str, Set[str]]
         self.volumes = defaultdict(set)
 
+        # Addresses and ports (address:port) found in environment
+        # variables, probably services used by the container
+        self.endpoints: Set[str]
+        self.endpoints = set()
+
+        # Resource usage, if sampled (see stats.StatsCollector)
+        self.stats: Optional[Dict[str, float]]
+        self.stats = None
+
         self.__backend_port = None
         self.__url = str()
 
@@ -86,6 +107,116 @@ class ContainerInfos:
             value += suffix
         self.__url = value
 
+    def to_dict(self) -> Dict[str, Any]:
+        """Return a JSON serializable representation of the container."""
+        return {
+            'name': self.name,
+            'image': self.image,
+            'ports': {k: sorted(v) for k, v in self.ports.items()},
+            'networks': sorted(self.networks),
+            'network_ids': dict(sorted(self.network_ids.items())),
+            'endpoints': sorted(self.endpoints),
+            'links': sorted(self.links),
+            'bind_mounts': {k: sorted(v) for k, v in self.bind_mounts.items()},
+            'volumes': {k: sorted(v) for k, v in self.volumes.items()},
+            'backend_port': self.__backend_port,
+            'url': self.__url,
+            'stats': self.stats
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ContainerInfos':
+        """
+        Create a container from the output of to_dict.
+
+        :param data : serialized container
+        """
+        cont = cls(data['name'])
+        cont.image = data['image']
+        for exposed_port, host_ports in data['ports'].items():
+            cont.ports[exposed_port].update(host_ports)
+        cont.networks.update(data['networks'])
+        cont.network_ids.update(data.get('network_ids', {}))
+        cont.endpoints.update(data.get('endpoints', []))
+        cont.links.update(data['links'])
+        for source, dests in data['bind_mounts'].items():
+            cont.bind_mounts[source].update(dests)
+        for source, dests in data['volumes'].items():
+            cont.volumes[source].update(dests)
+        # Values are already normalized, bypass the setters
+        cont.__backend_port = data['backend_port']
+        cont.__url = data['url']
+        cont.stats = data.get('stats')
+        return cont
+
+
+class HostInfos:
+    """
+    Represent the collected state of a host, independently of Docker.
+
+    This is all GraphBuilder needs to build the graph of a host, so
+    it can be stored and built again later or by another process.
+    """
+
+    def __init__(self,
+                 name: str,
+                 label: str,
+                 containers: List[ContainerInfos],
+                 traefik_container: str = '',
+                 traefik_source_port: str = '',
+                 collected_at: datetime = None,
+                 addresses: List[str] = None):
+        """
+        Create a host from collected containers.
+
+        :param name : name of the host, as in the configuration
+        :param label : label to put on the host graph
+        :param containers : running containers of the host
+        :param traefik_container : name of Traefik container if applicable
+        :param traefik_source_port : source port of Traefik container
+        :param collected_at : date of the collection, default to now
+        :param addresses : public names and IP addresses of the host
+        """
+        self.name = name
+        self.label = label
+        self.containers = containers
+        self.traefik_container = traefik_container
+        self.traefik_source_port = traefik_source_port
+        self.collected_at = collected_at \
+            if collected_at is not None else datetime.now()
+        self.addresses = addresses if addresses is not None else []
+        # Whether this state comes from a cache rather than from the host
+        self.stale = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return a JSON serializable representation of the host."""
+        return {
+            'name': self.name,
+            'label': self.label,
+            'traefik_container': self.traefik_container,
+            'traefik_source_port': self.traefik_source_port,
+            'collected_at': self.collected_at.isoformat(),
+            'addresses': self.addresses,
+            'containers': [cont.to_dict() for cont in self.containers]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'HostInfos':
+        """
+        Create a host from the output of to_dict.
+
+        :param data : serialized host
+        """
+        return cls(
+            data['name'],
+            data['label'],
+            [ContainerInfos.from_dict(c) for c in data['containers']],
+            data['traefik_container'],
+            data['traefik_source_port'],
+            datetime.fromisoformat(data['collected_at']),
+            data.get('addresses', [])
+        )
+
 
 class DockerInfo:
     """
@@ -106,10 +237,12 @@ class DockerInfo:
             self.update_containers()
         return self.__containers
 
-    def __init__(self, docker_client: docker.DockerClient):
+    def __init__(self, docker_client: 'docker.DockerClient'):
         """Initialize the builder from an existing DockerClient."""
         self.__docker_client = docker_client
         self.__containers: List[ContainerInfos] = []
+        # Docker objects of the containers, to sample their statistics
+        self.__docker_containers = {}
 
         # Name of Traefik container if applicable
         self.traefik_container = ''
@@ -124,6 +257,7 @@ class DockerInfo:
         """
         # Drop existing containers
         self.__containers = []
+        self.__docker_containers = {}
 
         # Get all running containers
         for cont in self.__docker_client.containers.list():
@@ -187,6 +321,7 @@ class DockerInfo:
                 # Add networks and links
                 for network_name, params in networks_conf['Networks'].items():
                     cont_info.networks.add(network_name)
+                    cont_info.network_ids[network_name] = params['NetworkID']
                     links = params['Links']
                     if links is not None:
                         # The part before : is the link name (i.e. the
@@ -195,6 +330,13 @@ class DockerInfo:
                             [link.split(':')[0] for link in links]
                         )
 
+                # Find other services in environment variables
+                for variable in cont.attrs['Config'].get('Env') or []:
+                    value = variable.split('=', 1)[-1]
+                    cont_info.endpoints.update(
+                        f'{address.lower()}:{port}'
+                        for address, port in ENDPOINT_REGEX.findall(value))
+
                 # Get bind mounts and volumes
                 for mount in cont.attrs['Mounts']:
                     dest = mount['Destination']
@@ -210,9 +352,20 @@ class DockerInfo:
                 # port mapping in the graph
                 if cont_info.image.split(':')[0] == 'traefik':
                     self.traefik_container = cont_info.name
-                    self.traefik_source_port = list(cont_info.ports)[0]
+                    self.traefik_source_port = sorted(cont_info.ports)[0]
                     info = 'Traefik found, using %s as source port in mapping'
                     logging.info(info, self.traefik_source_port)
 
                 self.__containers.append(cont_info)
+                self.__docker_containers[cont_info.name] = cont
         return self.__containers
+
+    def update_stats(self, collector: 'StatsCollector'):
+        """
+        Sample resource usage of the containers and store it in them.
+
+        :param collector : collector sampling containers concurrently
+        """
+        stats = collector.collect(list(self.__docker_containers.values()))
+        for cont_info in self.__containers:
+            cont_info.stats = stats.get(cont_info.name)
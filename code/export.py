@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Logic to export the collected state of hosts in data formats."""
+
+import json
+import logging
+import os
+import xml.etree.ElementTree as ET
+
+from datetime import datetime
+from typing import Any, Dict, List
+
+from docker_info import HostInfos
+
+# Supported formats and the suffix of their file
+EXPORT_FORMATS = {
+    'json': 'topology.json',
+    'ndjson': 'containers.ndjson',
+    'graphml': 'topology.graphml',
+    'parquet': 'containers.parquet'
+}
+GRAPHML_NAMESPACE = 'http://graphml.graphdrawing.org/xmlns'
+
+
+class TopologyExporter:
+    """
+    Write the collected state of hosts in machine-readable formats.
+
+    Files are written straight from HostInfos objects, without building
+    nor rendering any graph, for tools which need the topology rather
+    than a picture. Excluded containers and hidden elements are left
+    out, as on the graphs.
+    """
+
+    def __init__(self,
+                 organization: str,
+                 output_path: str,
+                 hide: List[str] = None):
+        """
+        Initialize the exporter.
+
+        :param organization : name of the organization, used for files
+        :param output_path : directory of exported files
+        :param hide : elements to hide (volumes, binds and/or urls)
+        """
+        self.organization = organization
+        self.output_path = output_path
+        self.hide = hide if hide is not None else []
+
+    def export(self,
+               hosts: List[HostInfos],
+               excludes: Dict[str, List[str]],
+               formats: List[str]) -> List[str]:
+        """
+        Write hosts in the given formats and return the written files.
+
+        :param hosts : state of hosts to export
+        :param excludes : names of containers to exclude of each host
+        :param formats : formats to write, among EXPORT_FORMATS
+        """
+        writers = {
+            'json': self.__write_json,
+            'ndjson': self.__write_ndjson,
+            'graphml': self.__write_graphml,
+            'parquet': self.__write_parquet
+        }
+        rows = self.__rows(hosts, excludes)
+        files = []
+        for export_format in formats:
+            path = os.path.join(
+                self.output_path,
+                f'{self.organization}.{EXPORT_FORMATS[export_format]}')
+            try:
+                writers[export_format](path, hosts, rows)
+                files.append(path)
+                logging.info('Topology exported to %s', path)
+            except ImportError as e:
+                logging.error('Missing dependency for %s export, skipping.',
+                              export_format)
+                logging.exception(e)
+        return files
+
+    def __rows(self,
+               hosts: List[HostInfos],
+               excludes: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+        """Return one dictionary per container, with its host name."""
+        rows = []
+        for host in hosts:
+            exclude = excludes.get(host.name, [])
+            for cont in sorted(host.containers, key=lambda c: c.name):
+                if cont.name in exclude:
+                    continue
+                row = {'host': host.name, **cont.to_dict()}
+                if 'binds' in self.hide:
+                    row['bind_mounts'] = {}
+                if 'volumes' in self.hide:
+                    row['volumes'] = {}
+                if 'urls' in self.hide:
+                    row['url'] = None
+                rows.append(row)
+        return rows
+
+    def topology(self,
+                 hosts: List[HostInfos],
+                 excludes: Dict[str, List[str]]) -> Dict[str, Any]:
+        """
+        Return a JSON serializable document with hosts and containers.
+
+        Unlike the exported file, the document has no export time, so
+        that it only changes with the state of hosts.
+
+        :param hosts : state of hosts to export
+        :param excludes : names of containers to exclude of each host
+        """
+        return self.__document(hosts, self.__rows(hosts, excludes))
+
+    def __write_json(self,
+                     path: str,
+                     hosts: List[HostInfos],
+                     rows: List[Dict[str, Any]]):
+        """Write a single document with hosts and their containers."""
+        document = self.__document(hosts, rows)
+        document['exported_at'] = datetime.now().isoformat()
+        with open(path, 'w') as export_file:
+            json.dump(document, export_file)
+
+    def __document(self,
+                   hosts: List[HostInfos],
+                   rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Return a single document with hosts and their containers."""
+        return {
+            'organization': self.organization,
+            'hosts': [
+                {
+                    'name': host.name,
+                    'label': host.label,
+                    'addresses': host.addresses,
+                    'collected_at': host.collected_at.isoformat(),
+                    'stale': host.stale,
+                    'containers': [
+                        row for row in rows if row['host'] == host.name
+                    ]
+                }
+                for host in hosts
+            ]
+        }
+
+    @staticmethod
+    def __write_ndjson(path: str,
+                       hosts: List[HostInfos],
+                       rows: List[Dict[str, Any]]):
+        """Write one JSON document per container and per line."""
+        with open(path, 'w') as export_file:
+            for row in rows:
+                export_file.write(json.dumps(row))
+                export_file.write('\n')
+
+    @staticmethod
+    def __write_graphml(path: str,
+                        hosts: List[HostInfos],
+                        rows: List[Dict[str, Any]]):
+        """
+        Write a GraphML graph of hosts, containers, networks and volumes.
+
+        Containers are linked to their host, networks, volumes and host
+        folders, and to the containers they are linked to.
+        """
+        root = ET.Element('graphml', {'xmlns': GRAPHML_NAMESPACE})
+        for key in ['kind', 'label', 'image', 'url']:
+            ET.SubElement(root, 'key', {
+                'id': key, 'for': 'node',
+                'attr.name': key, 'attr.type': 'string'})
+        ET.SubElement(root, 'key', {
+            'id': 'relation', 'for': 'edge',
+            'attr.name': 'relation', 'attr.type': 'string'})
+        graph = ET.SubElement(root, 'graph', {'edgedefault': 'directed'})
+
+        nodes = set()
+
+        def add_node(node_id: str, kind: str, label: str, **data: str):
+            if node_id in nodes:
+                return
+            nodes.add(node_id)
+            node = ET.SubElement(graph, 'node', {'id': node_id})
+            for key, value in {'kind': kind, 'label': label, **data}.items():
+                if value:
+                    ET.SubElement(node, 'data', {'key': key}).text = value
+
+        def add_edge(source: str, target: str, relation: str):
+            edge = ET.SubElement(
+                graph, 'edge', {'source': source, 'target': target})
+            ET.SubElement(edge, 'data', {'key': 'relation'}).text = relation
+
+        for host in hosts:
+            add_node(f'host/{host.name}', 'host', host.label)
+        for row in rows:
+            cont_id = f"container/{row['host']}/{row['name']}"
+            add_node(cont_id, 'container', row['name'],
+                     image=row['image'], url=row['url'])
+            add_edge(cont_id, f"host/{row['host']}", 'runs_on')
+            for network in row['networks']:
+                network_id = row['network_ids'].get(
+                    network, f"{row['host']}/{network}")
+                add_node(f'network/{network_id}', 'network', network)
+                add_edge(cont_id, f'network/{network_id}', 'member_of')
+            for link in row['links']:
+                add_edge(cont_id, f"container/{row['host']}/{link}", 'link')
+            for kind, mounts in [('volume', row['volumes']),
+                                 ('bind_mount', row['bind_mounts'])]:
+                for source in mounts:
+                    source_id = f"{kind}/{row['host']}/{source}"
+                    add_node(source_id, kind, source)
+                    add_edge(cont_id, source_id, 'mounts')
+        # Links may target excluded or stopped containers
+        for edge in list(graph.iter('edge')):
+            if edge.get('target') not in nodes:
+                graph.remove(edge)
+
+        ET.ElementTree(root).write(path, encoding='utf-8',
+                                   xml_declaration=True)
+
+    @staticmethod
+    def __write_parquet(path: str,
+                        hosts: List[HostInfos],
+                        rows: List[Dict[str, Any]]):
+        """Write a columnar Parquet table, one row per container."""
+        import pyarrow
+        import pyarrow.parquet
+
+        table = pyarrow.table({
+            'host': [row['host'] for row in rows],
+            'name': [row['name'] for row in rows],
+            'image': [row['image'] for row in rows],
+            'networks': [row['networks'] for row in rows],
+            'links': [row['links'] for row in rows],
+            'exposed_ports': [sorted(row['ports']) for row in rows],
+            'published_ports': [
+                sorted({p for ports in row['ports'].values() for p in ports})
+                for row in rows
+            ],
+            'volumes': [sorted(row['volumes']) for row in rows],
+            'bind_mounts': [sorted(row['bind_mounts']) for row in rows],
+            'url': [row['url'] for row in rows],
+            'backend_port': [row['backend_port'] for row in rows]
+        })
+        pyarrow.parquet.write_table(table, path)
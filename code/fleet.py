@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Logic to find relations between containers of different hosts."""
+
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from graphviz import Digraph
+
+from build import node_name
+from docker_info import ContainerInfos, HostInfos
+
+# Pseudo host name of nodes which do not belong to a host
+FLEET_NAME = 'fleet'
+
+
+class FleetIndex:
+    """
+    Index containers of all hosts to find relations between hosts.
+
+    Two kinds of relations are found :
+    * Containers of different hosts in the same overlay network, i.e.
+      a network with the same Docker identifier on several hosts
+    * Containers whose environment refers to an address and a port
+      published by a container of another host
+
+    Indexes are dictionaries filled in a single pass over containers,
+    so the cost is linear with the number of containers, ports and
+    endpoints. An overlay network is drawn as a node linked to its
+    containers rather than by linking each pair of containers.
+    """
+
+    def __init__(self,
+                 hosts: Dict[str, HostInfos],
+                 containers: Dict[str, List[ContainerInfos]]):
+        """
+        Build the indexes.
+
+        :param hosts : state of each host, indexed by host name
+        :param containers : drawn containers of each host
+        """
+        # Network identifier -> network name and (host, container) pairs
+        self.__networks: Dict[str, List[Tuple[str, str]]] = \
+            defaultdict(list)
+        self.__network_names: Dict[str, str] = {}
+        # (address, host port) -> (host, container, exposed port)
+        self.__published: Dict[Tuple[str, str], Tuple[str, str, str]] = {}
+
+        for host_name, host_containers in containers.items():
+            addresses = [a.lower() for a in hosts[host_name].addresses]
+            for cont in host_containers:
+                for network, network_id in cont.network_ids.items():
+                    self.__networks[network_id].append((host_name, cont.name))
+                    self.__network_names[network_id] = network
+                for exposed_port, host_ports in cont.ports.items():
+                    for port in host_ports:
+                        for address in addresses:
+                            self.__published[(address, port)] = \
+                                (host_name, cont.name, exposed_port)
+        self.__containers = containers
+
+    @property
+    def overlay_networks(self) -> Dict[str, List[Tuple[str, str]]]:
+        """Return (host, container) pairs of networks spanning hosts."""
+        return {
+            network_id: members
+            for network_id, members in self.__networks.items()
+            if len({host_name for host_name, _ in members}) > 1
+        }
+
+    @property
+    def endpoint_links(self) -> List[Tuple[str, str, str, str, str]]:
+        """
+        Return containers using a port published on another host.
+
+        Each link is (host, container, target host, target container,
+        target exposed port).
+        """
+        links = []
+        for host_name, host_containers in self.__containers.items():
+            for cont in host_containers:
+                for endpoint in sorted(cont.endpoints):
+                    address, port = endpoint.rsplit(':', 1)
+                    target = self.__published.get((address, port))
+                    if target is not None and target[0] != host_name:
+                        links.append((host_name, cont.name, *target))
+        return links
+
+    def draw(self, graph: Digraph, color_scheme: Dict[str, str]):
+        """
+        Add relations between hosts to a graph containing all hosts.
+
+        :param graph : merged graph of all hosts
+        :param color_scheme : colors used for the graph
+        """
+        edge_style = {
+            'style': 'dashed',
+            'color': color_scheme['link'],
+            'constraint': 'false'
+        }
+        for network_id, members in sorted(self.overlay_networks.items()):
+            network_node = node_name(f'overlay_{network_id}', FLEET_NAME)
+            graph.node(
+                network_node,
+                self.__network_names[network_id],
+                shape='oval',
+                color=color_scheme['link'],
+                fillcolor=color_scheme['network'],
+                fontcolor=color_scheme['dark_text']
+            )
+            for host_name, cont_name in members:
+                graph.edge(
+                    tail_name=node_name(cont_name, host_name),
+                    head_name=network_node,
+                    arrowhead='none',
+                    **edge_style
+                )
+
+        for host_name, cont_name, target_host, target, port in \
+                self.endpoint_links:
+            graph.edge(
+                tail_name=node_name(cont_name, host_name),
+                head_name=node_name(target, target_host, port),
+                **edge_style
+            )
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Logic to keep the history of the collected state of hosts."""
+
+import gzip
+import json
+import logging
+import os
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from docker_info import HostInfos
+
+# Sub-directory of the output directory containing the history
+HISTORY_DIRECTORY = 'history'
+# Default number of deltas between two full states
+DEFAULT_KEYFRAME_INTERVAL = 24
+
+
+class HistoryStore:
+    """
+    Append-only history of the collected state of each host.
+
+    Each host has its own directory, with an index and one file per
+    recorded state. Every "keyframe_interval" records, the full state of
+    the host is written (keyframe). Other records only hold the
+    difference with the previous state (delta) : host attributes which
+    changed, containers added or changed, indexed by name, and names of
+    removed containers. A record without any difference has no file.
+    Files are compressed with gzip.
+
+    The index is a JSON Lines file, one record per line, with the
+    collection time, the kind of record and its file. A state is rebuilt
+    from the last keyframe before it, by applying the following deltas.
+
+    Resource usage is not part of the history, as it changes each time.
+    """
+
+    def __init__(self,
+                 output_path: str,
+                 keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL,
+                 retention: float = None):
+        """
+        Initialize the store.
+
+        :param output_path : output directory
+        :param keyframe_interval : number of deltas between two keyframes
+        :param retention : duration records are kept, in seconds, if set
+        """
+        self.path = os.path.join(output_path, HISTORY_DIRECTORY)
+        self.keyframe_interval = keyframe_interval
+        self.retention = retention
+        # Last recorded state of each host, to compute deltas
+        self.__last: Dict[str, Dict[str, Any]] = {}
+
+    def append(self, host: HostInfos):
+        """
+        Record a new state of a host, then drop expired records.
+
+        :param host : collected state of the host
+        """
+        state = self.__state(host)
+        index = self.__read_index(host.name)
+        previous = self.__last.get(host.name)
+        if previous is None and index:
+            previous = self.__rebuild(host.name, index)
+
+        deltas = 0
+        for entry in reversed(index):
+            if entry['kind'] == 'full':
+                break
+            deltas += 1
+        full = previous is None or deltas >= self.keyframe_interval
+
+        entry = {'at': host.collected_at.isoformat(),
+                 'kind': 'full' if full else 'delta',
+                 'file': None}
+        record = state if full else self.__delta(previous, state)
+        if record:
+            stamp = host.collected_at.strftime('%Y%m%dT%H%M%S%f')
+            entry['file'] = f"{stamp}.{entry['kind']}.json.gz"
+            self.__write_record(host.name, entry['file'], record)
+        self.__append_index(host.name, entry)
+        self.__last[host.name] = state
+
+        if self.retention is not None:
+            self.compact(host.name, index + [entry])
+
+    def rebuild(self, host_name: str, at: datetime) -> Optional[HostInfos]:
+        """
+        Return the state of a host at a given time, if recorded.
+
+        :param host_name : name of the host, as in the configuration
+        :param at : time of the state, the last state before it is used
+        """
+        at = self.__naive(at.isoformat())
+        index = [entry for entry in self.__read_index(host_name)
+                 if self.__naive(entry['at']) <= at]
+        if not index:
+            return None
+        return HostInfos.from_dict(self.__rebuild(host_name, index))
+
+    def compact(self, host_name: str, index: List[Dict[str, Any]] = None):
+        """
+        Drop records older than the retention duration.
+
+        Records are dropped up to the last keyframe before the oldest
+        record to keep, so that all kept states can still be rebuilt.
+
+        :param host_name : name of the host, as in the configuration
+        :param index : index of the host, read from disk if not given
+        """
+        if index is None:
+            index = self.__read_index(host_name)
+        limit = datetime.now() - timedelta(seconds=self.retention)
+        kept = [i for i, entry in enumerate(index)
+                if self.__naive(entry['at']) >= limit]
+        # Always keep the last state
+        oldest = kept[0] if kept else len(index) - 1
+        first = max((i for i in range(oldest + 1)
+                     if index[i]['kind'] == 'full'), default=0)
+        if first == 0:
+            return
+
+        logging.info('Dropping %d history records of %s', first, host_name)
+        self.__write_index(host_name, index[first:])
+        for entry in index[:first]:
+            if entry['file'] is not None:
+                try:
+                    os.remove(os.path.join(self.path, host_name,
+                                           entry['file']))
+                except FileNotFoundError:
+                    pass
+
+    def __rebuild(self,
+                  host_name: str,
+                  index: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Return the state of a host at the last record of an index.
+
+        :param host_name : name of the host, as in the configuration
+        :param index : records of the host, up to the wanted state
+        """
+        start = max(i for i, entry in enumerate(index)
+                    if entry['kind'] == 'full')
+        state = self.__read_record(host_name, index[start]['file'])
+        for entry in index[start + 1:]:
+            if entry['file'] is not None:
+                state = self.__apply(
+                    state, self.__read_record(host_name, entry['file']))
+        # The collection time is not part of deltas
+        state['collected_at'] = index[-1]['at']
+        return state
+
+    @staticmethod
+    def __state(host: HostInfos) -> Dict[str, Any]:
+        """Return the recorded state of a host, without resource usage."""
+        state = host.to_dict()
+        for cont in state['containers']:
+            cont.pop('stats', None)
+        return state
+
+    @staticmethod
+    def __delta(previous: Dict[str, Any],
+                state: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the difference between two states, empty if none."""
+        delta: Dict[str, Any] = {}
+        host = {key: value for key, value in state.items()
+                if key not in ('containers', 'collected_at')
+                and previous.get(key) != value}
+        if host:
+            delta['host'] = host
+        before = {cont['name']: cont for cont in previous['containers']}
+        after = {cont['name']: cont for cont in state['containers']}
+        changed = {name: cont for name, cont in after.items()
+                   if before.get(name) != cont}
+        if changed:
+            delta['changed'] = changed
+        removed = sorted(set(before) - set(after))
+        if removed:
+            delta['removed'] = removed
+        return delta
+
+    @staticmethod
+    def __apply(state: Dict[str, Any],
+                delta: Dict[str, Any]) -> Dict[str, Any]:
+        """Return a state with a delta applied."""
+        containers = {cont['name']: cont for cont in state['containers']}
+        containers.update(delta.get('changed', {}))
+        for name in delta.get('removed', []):
+            containers.pop(name, None)
+        return {
+            **state,
+            **delta.get('host', {}),
+            'containers': [containers[name] for name in sorted(containers)]
+        }
+
+    @staticmethod
+    def __naive(timestamp: str) -> datetime:
+        """Return a timestamp of the index as a naive local time."""
+        moment = datetime.fromisoformat(timestamp)
+        if moment.tzinfo is not None:
+            moment = moment.astimezone().replace(tzinfo=None)
+        return moment
+
+    def __read_index(self, host_name: str) -> List[Dict[str, Any]]:
+        """Return the records of a host, oldest first."""
+        path = os.path.join(self.path, host_name, 'index.jsonl')
+        if not os.path.exists(path):
+            return []
+        with open(path) as index_file:
+            return [json.loads(line) for line in index_file if line.strip()]
+
+    def __append_index(self, host_name: str, entry: Dict[str, Any]):
+        """Add a record at the end of the index of a host."""
+        path = os.path.join(self.path, host_name, 'index.jsonl')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a') as index_file:
+            index_file.write(json.dumps(entry) + '\n')
+
+    def __write_index(self, host_name: str, index: List[Dict[str, Any]]):
+        """Replace the index of a host atomically."""
+        path = os.path.join(self.path, host_name, 'index.jsonl')
+        with open(f'{path}.tmp', 'w') as index_file:
+            for entry in index:
+                index_file.write(json.dumps(entry) + '\n')
+        os.replace(f'{path}.tmp', path)
+
+    def __write_record(self,
+                       host_name: str,
+                       name: str,
+                       record: Dict[str, Any]):
+        """Write a compressed record, before it is added to the index."""
+        path = os.path.join(self.path, host_name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(path, 'wt') as record_file:
+            json.dump(record, record_file)
+
+    def __read_record(self, host_name: str, name: str) -> Dict[str, Any]:
+        """Read a compressed record."""
+        path = os.path.join(self.path, host_name, name)
+        with gzip.open(path, 'rt') as record_file:
+            return json.load(record_file)
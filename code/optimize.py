@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Logic to render PNG files under size constraints and to compress them."""
+
+import logging
+import math
+import os
+import shutil
+import subprocess
+
+from typing import Any, Dict, List
+
+from graphviz import Digraph, render
+
+from profiler import Profiler, stage
+
+# Lossless PNG optimizers, by order of preference, and their arguments
+PNG_TOOLS = [
+    ('oxipng', ['-o', '2', '--strip', 'safe', '-q']),
+    ('optipng', ['-quiet', '-o2']),
+    ('pngcrush', ['-ow', '-q'])
+]
+# Default resolution of Graphviz for bitmap outputs
+DEFAULT_DPI = 96
+
+
+class PNGOptimizer:
+    """
+    Render graphs in PNG format according to the "png" configuration.
+
+    Without configuration, the files are rendered as Graphviz produces
+    them. Otherwise, the resolution and the dimensions can be capped,
+    the files are losslessly compressed, the resolution is lowered
+    until a file fits in a byte budget and thumbnails can be generated.
+    """
+
+    def __init__(self,
+                 config: Dict[str, Any] = None,
+                 profiler: Profiler = None):
+        """
+        Initialize the optimizer.
+
+        :param config : "png" section of the configuration
+        :param profiler : profiler of the stages of the run, if enabled
+        """
+        config = config if config is not None else {}
+        self.dpi = config.get('dpi', DEFAULT_DPI)
+        self.min_dpi = config.get('min_dpi', 36)
+        self.max_size = config.get('max_size')
+        self.max_bytes = config.get('max_bytes')
+        self.optimize = config.get('optimize', False)
+        self.thumbnail = config.get('thumbnail')
+        self.__enabled = bool(config)
+        self.__profiler = profiler
+
+    def render(self, graph: Digraph, path: str) -> List[str]:
+        """
+        Render a graph in PNG format and return the paths of created files.
+
+        :param graph : graph to render
+        :param path : path of the DOT file, ".png" is added for the image
+        """
+        if not self.__enabled:
+            self.__draw(graph, path)
+            return [f'{path}.png']
+
+        dpi = self.dpi
+        while True:
+            self.__render_at(graph, path, dpi, self.max_size)
+            if self.optimize:
+                self.__compress(f'{path}.png')
+            size = os.path.getsize(f'{path}.png')
+            if self.max_bytes is None or size <= self.max_bytes \
+                    or dpi <= self.min_dpi:
+                break
+            # The number of pixels, hence roughly the size of the file,
+            # grows with the square of the resolution
+            new_dpi = int(dpi * math.sqrt(self.max_bytes / size) * 0.95)
+            dpi = max(self.min_dpi, min(new_dpi, dpi - 1))
+            logging.info('%s.png is %d bytes, over budget : render at %d DPI',
+                         path, size, dpi)
+
+        if self.max_bytes is not None and size > self.max_bytes:
+            logging.warning('%s.png is still over budget (%d bytes) '
+                            'at minimal resolution', path, size)
+
+        files = [f'{path}.png']
+        if self.thumbnail is not None:
+            self.__render_at(graph, f'{path}.thumb', DEFAULT_DPI,
+                             self.thumbnail)
+            if self.optimize:
+                self.__compress(f'{path}.thumb.png')
+            files.append(f'{path}.thumb.png')
+        return files
+
+    def __render_at(self,
+                    graph: Digraph,
+                    path: str,
+                    dpi: int,
+                    max_size: int):
+        """
+        Render a copy of the graph with a resolution and a maximum size.
+
+        :param graph : graph to render
+        :param path : path of the DOT file
+        :param dpi : resolution of the image
+        :param max_size : maximum width and height in pixels, if any
+        """
+        graph = graph.copy()
+        graph.format = 'png'
+        graph.graph_attr['dpi'] = str(dpi)
+        if max_size is not None:
+            # Graphviz only scales down drawings larger than "size"
+            inches = max_size / dpi
+            graph.graph_attr['size'] = f'{inches:.2f},{inches:.2f}'
+        self.__draw(graph, path)
+
+    def __draw(self, graph: Digraph, path: str):
+        """
+        Write the DOT source of a graph, then render it with Graphviz.
+
+        Both steps are profiled separately, as DOT quoting and the layout
+        by Graphviz may both be slow on large graphs.
+
+        :param graph : graph to render
+        :param path : path of the DOT file
+        """
+        name = os.path.basename(path)
+        with stage(self.__profiler, f'serialize.{name}'):
+            graph.save(path)
+        with stage(self.__profiler, f'render.{name}'):
+            render(graph.engine, graph.format, path)
+
+    @staticmethod
+    def __compress(path: str):
+        """
+        Losslessly compress a PNG file in place.
+
+        Use the first available command line tool, otherwise
+        fall back on Pillow if it is installed.
+
+        :param path : path of the PNG file
+        """
+        for tool, args in PNG_TOOLS:
+            if shutil.which(tool) is not None:
+                try:
+                    subprocess.run([tool, *args, path], check=True)
+                    return
+                except subprocess.CalledProcessError as e:
+                    logging.error('Error compressing %s with %s', path, tool)
+                    logging.exception(e)
+
+        try:
+            from PIL import Image
+        except ImportError:
+            logging.debug('No PNG optimizer found, %s left as is', path)
+            return
+        tmp_path = f'{path}.tmp'
+        with Image.open(path) as image:
+            image.save(tmp_path, format='PNG', optimize=True)
+        # Keep the smallest file, Graphviz output may already be tight
+        if os.path.getsize(tmp_path) < os.path.getsize(path):
+            os.replace(tmp_path, path)
+        else:
+            os.remove(tmp_path)
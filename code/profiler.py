@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Logic to profile each stage of a run and write flamegraph inputs."""
+
+import contextlib
+import cProfile
+import logging
+import os
+import pstats
+import re
+import threading
+
+from typing import ContextManager, Dict, List, Optional, Tuple
+
+# Sub-directory of the output directory receiving profiles
+PROFILE_DIRECTORY = 'profile'
+
+
+def stage(profiler: Optional['Profiler'], name: str) -> ContextManager:
+    """
+    Return a context profiling a stage, or doing nothing without profiler.
+
+    :param profiler : profiler of the run, None if profiling is disabled
+    :param name : name of the stage, used for file names
+    """
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.stage(name)
+
+
+class Profiler:
+    """
+    Profile named stages of a run with cProfile.
+
+    Each stage is profiled in the thread running it, and stages with the
+    same name are aggregated, e.g. all renderings of a file at several
+    resolutions. For each stage, two files are written in the "profile"
+    sub-directory of the output directory :
+    * <stage>.prof : cProfile statistics, readable by pstats or snakeviz
+    * <stage>.folded : collapsed stacks, readable by flamegraph.pl,
+      inferno or speedscope, weighted in microseconds
+
+    Stages must not be nested within the same thread. Python 3.12+
+    only allows one active profiler in the whole process, so that
+    GraphBot runs stages one after the other when profiling.
+    """
+
+    def __init__(self, output_path: str):
+        """
+        Initialize a profiler without any stage.
+
+        :param output_path : output directory of the run
+        """
+        self.output_path = os.path.join(output_path, PROFILE_DIRECTORY)
+        self.__stats: Dict[str, pstats.Stats] = {}
+        self.__lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """
+        Profile the code run within this context.
+
+        :param name : name of the stage, used for file names
+        """
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ only allows one active profiler at a time
+            logging.warning('Another stage is profiled, %s is not.', name)
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self.__lock:
+                if name in self.__stats:
+                    self.__stats[name].add(profile)
+                else:
+                    self.__stats[name] = pstats.Stats(profile)
+
+    def write(self) -> List[str]:
+        """Write statistics and collapsed stacks of each stage so far."""
+        os.makedirs(self.output_path, exist_ok=True)
+        with self.__lock:
+            stats = dict(self.__stats)
+        files = []
+        for name, stage_stats in sorted(stats.items()):
+            base = os.path.join(self.output_path,
+                                re.sub(r'[^\w.-]', '_', name))
+            stage_stats.dump_stats(f'{base}.prof')
+            with open(f'{base}.folded', 'w') as folded:
+                for stack, weight in self.__collapse(stage_stats):
+                    folded.write(f'{stack} {weight}\n')
+            files.extend([f'{base}.prof', f'{base}.folded'])
+        logging.info('Profiles of %d stages written to %s',
+                     len(stats), self.output_path)
+        return files
+
+    @staticmethod
+    def __collapse(stats: pstats.Stats) -> List[Tuple[str, int]]:
+        """
+        Return collapsed stacks rebuilt from the call graph of statistics.
+
+        cProfile only records callers and callees, not whole stacks : the
+        own time of a function is split between its callers in proportion
+        to the time spent under each of them. Recursive calls, and paths
+        shorter than a microsecond, are cut.
+
+        :param stats : statistics of a stage
+        """
+        def label(func: Tuple[str, int, str]) -> str:
+            filename, line, function = func
+            if filename == '~':
+                # Built-in functions
+                return function.replace(' ', '_')
+            return f'{function} ({os.path.basename(filename)}:{line})' \
+                .replace(';', ':')
+
+        callees: Dict[Tuple, Dict[Tuple, float]] = {}
+        for func, (_, _, _, _, callers) in stats.stats.items():
+            for caller, (_, _, _, cumulative) in callers.items():
+                callees.setdefault(caller, {})[func] = cumulative
+
+        weights: Dict[str, float] = {}
+
+        def walk(func: Tuple, path: List[Tuple], share: float):
+            _, _, own, cumulative, _ = stats.stats[func]
+            path = path + [func]
+            stack = ';'.join(label(f) for f in path)
+            weights[stack] = weights.get(stack, 0) + own * share
+            for callee, edge in callees.get(func, {}).items():
+                callee_cumulative = stats.stats[callee][3]
+                # Paths under a microsecond would not be drawn anyway,
+                # and cutting them keeps the walk short
+                if callee in path or share * edge < 1e-6:
+                    continue
+                walk(callee, path,
+                     share * min(1, edge / callee_cumulative))
+
+        for func, (_, _, _, _, callers) in stats.stats.items():
+            if not callers:
+                walk(func, [], 1)
+
+        return [(stack, round(weight * 1e6))
+                for stack, weight in sorted(weights.items())
+                if round(weight * 1e6) > 0]
@@ -2,22 +2,57 @@
 # coding=utf-8
 """Logic to render DOT graphs representing a complete infrastructure in PNG."""
 
+import asyncio
+import functools
 import json
+import math
 import os
 import logging
+import threading
+import time
 
-from urllib.request import urlopen
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-import docker
-import dns.resolver
-import jsonschema
-from jsonschema.exceptions import ValidationError, SchemaError
-from graphviz import Digraph
+from graphviz import Digraph, pipe
 
-from build import GraphBuilder
-from actions import WebDAVUploader, SFTPUploader
+from build import GraphBuilder, node_name
+from cache import HostCache
+from docker_info import DockerInfo, HostInfos
+from export import TopologyExporter
+from fleet import FleetIndex
+from history import HistoryStore
+from snapshot import load_snapshots
+from actions import ACTIONS, Action, load_action
+from optimize import PNGOptimizer
+from profiler import Profiler, stage
+from viewer import HTMLViewer
+
+
+# Host settings which require to connect again to the host
+CONNECTION_SETTINGS = ['url', 'port', 'tls_config']
+# Host settings which only change the graph of the host
+DRAWING_SETTINGS = ['exclude', 'default_network']
+# Global settings which change the graphs of all hosts
+STYLE_SETTINGS = ['organization', 'merge', 'formats', 'hide',
+                  'color_scheme', 'png', 'stable_output', 'cross_host_edges',
+                  'export', 'reports']
+
+
+@functools.lru_cache(maxsize=None)
+def schema_validator():
+    """Return the validator of the configuration, compiled only once."""
+    from jsonschema.validators import validator_for
+
+    schema_path = os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        'schema.json')
+    with open(schema_path) as schema_file:
+        schema = json.load(schema_file)
+    validator = validator_for(schema)
+    validator.check_schema(schema)
+    return validator(schema)
 
 
 class GraphBot:
@@ -64,22 +99,160 @@ class GraphBot:
             ))
         return legend
 
-    def __init__(self, config_file, output_path, certs_path):
-        """Initialize GraphBot. Read configuration from file."""
-        try:
-            with open(config_file) as fd:
-                self.config = json.load(fd)
-        except (OSError, IOError, json.JSONDecodeError) as e:
-            logging.error('Failed to read configuration.')
-            raise e
+    def __init__(self,
+                 config_file: str,
+                 output_path: str,
+                 certs_path: str,
+                 shard: Tuple[int, int] = None,
+                 profiler: Profiler = None):
+        """
+        Initialize GraphBot. Read configuration from file.
 
-        # Validate configuration
-        self.__check_config()
+        :param config_file : path of the configuration file
+        :param output_path : directory of generated files
+        :param certs_path : directory of TLS certificates
+        :param shard : index (starting at 1) and number of shards, if this
+                       instance only handles a subset of the hosts
+        :param profiler : profiler of the stages of the run, if enabled
+        """
+        self.__config_file = config_file
+        self.__certs_path = certs_path
+        # Modification time of the configuration file when last read
+        self.__config_mtime = None
+        # Read and validate configuration before any network work
+        self.config = self.__read_config()
 
         self.__graph = None
         self.__output_path = output_path
-        self.__certs_path = certs_path
+        self.__shard = shard
+        self.__profiler = profiler
         self.__generated_files = []
+        self.__optimizer = PNGOptimizer(self.config.get('png'), profiler)
+        self.__cache = HostCache(
+            output_path,
+            self.config.get('cache', {}).get('max_age'))
+        self.__history = self.__history_store()
+        # Containers drawn on the graph of each host
+        self.__containers = {}
+        # Last state of each host, refreshed or not
+        self.__hosts: Dict[str, HostInfos] = {}
+        # Docker client of each host, kept between refreshes
+        self.__clients = {}
+        self.__clients_lock = threading.Lock()
+        # Functions called with generated files after each rendering
+        self.__listeners: List[Callable[[List[str]], None]] = []
+        # Refreshes may be requested from several threads
+        self.__lock = threading.RLock()
+
+    def reload_config(self) -> Optional[List[str]]:
+        """
+        Read the configuration again if its file changed since last read.
+
+        Changes are applied host per host, so that connections and
+        states of unchanged hosts are kept. Hosts whose graph changed
+        (excluded containers, colors...) are rendered again from their
+        last state, without being queried.
+
+        An unreadable or invalid configuration is ignored, and the
+        current one is kept.
+
+        Return the names of the hosts which must be queried again (new
+        hosts or new connection settings), or None if the configuration
+        did not change.
+        """
+        with self.__lock:
+            try:
+                mtime = os.stat(self.__config_file).st_mtime_ns
+                if mtime == self.__config_mtime:
+                    return None
+                config = self.__read_config()
+            except Exception as e:
+                logging.error('Keeping current configuration.')
+                logging.exception(e)
+                return None
+
+            logging.info('Configuration reloaded from %s', self.__config_file)
+            previous_config, self.config = self.config, config
+            self.__optimizer = PNGOptimizer(self.config.get('png'),
+                                            self.__profiler)
+            self.__cache.max_age = self.config.get('cache', {}).get('max_age')
+            self.__history = self.__history_store()
+            if previous_config.get('cache') != self.config.get('cache'):
+                # Client timeouts depend on the latency budget
+                self.__clients.clear()
+
+            previous_hosts = {h['name']: h for h in previous_config['hosts']}
+            hosts = {h['name']: h for h in self.hosts}
+            removed = [name for name in self.__hosts if name not in hosts]
+            for name in removed:
+                logging.info('Host %s removed from configuration', name)
+                del self.__hosts[name]
+                self.__clients.pop(name, None)
+
+            queried, redrawn = [], []
+            for name, host in hosts.items():
+                previous = previous_hosts.get(name)
+                if previous is None or \
+                        self.__changed(previous, host, CONNECTION_SETTINGS):
+                    self.__clients.pop(name, None)
+                    queried.append(name)
+                elif self.__changed(previous, host, DRAWING_SETTINGS):
+                    redrawn.append(name)
+
+            if self.__changed(previous_config, self.config, STYLE_SETTINGS):
+                redrawn = [name for name in hosts if name not in queried]
+            redrawn = [name for name in redrawn if name in self.__hosts]
+            if redrawn or removed:
+                logging.info('Rendering again %s', ', '.join(redrawn))
+                self.__render_hosts(redrawn)
+            return queried
+
+    @property
+    def states(self) -> Dict[str, HostInfos]:
+        """Return the last state of each host, indexed by name."""
+        return dict(self.__hosts)
+
+    def topology(self, host_name: str = None) -> Dict[str, Any]:
+        """
+        Return the last state of hosts as a JSON serializable document.
+
+        Excluded containers and hidden elements are left out.
+
+        :param host_name : only export this host, default to all hosts
+        """
+        exporter = TopologyExporter(
+            self.config['organization'],
+            self.__output_path,
+            self.config.get('hide', []))
+        hosts = [self.__hosts[host['name']] for host in self.config['hosts']
+                 if host['name'] in self.__hosts
+                 and host_name in (None, host['name'])]
+        excludes = {host['name']: host.get('exclude', [])
+                    for host in self.config['hosts']}
+        return exporter.topology(hosts, excludes)
+
+    def add_listener(self, listener: Callable[[List[str]], None]):
+        """
+        Call a function with the generated files after each rendering.
+
+        :param listener : function taking a list of paths
+        """
+        self.__listeners.append(listener)
+
+    @property
+    def hosts(self) -> List[Dict[str, Any]]:
+        """
+        Return the configuration of the hosts handled by this instance.
+
+        Hosts are sorted by name and dealt in turn to each shard, so
+        that every shard gets the same hosts for a given configuration
+        and shards are balanced.
+        """
+        if self.__shard is None:
+            return self.config['hosts']
+        index, count = self.__shard
+        hosts = sorted(self.config['hosts'], key=lambda h: h['name'])
+        return hosts[index - 1::count]
 
     def build(self) -> Digraph:
         """
@@ -88,7 +261,143 @@ class GraphBot:
         The final graph is accessible with the graph property if merge is
         true in the configuration, otherwise you just get the last built
         graph.
+
+        When running as a shard, only the hosts of the shard are built
+        and the graphs are never merged : use merge() once all shards
+        are done.
         """
+        return self.refresh()
+
+    def refresh(self, host_names: List[str] = None) -> Digraph:
+        """
+        Query some hosts again, then render graphs and perform actions.
+
+        Other hosts keep the state of their last refresh : they are
+        still part of the merged graph, but their own files are not
+        rendered again.
+
+        :param host_names : names of the hosts to query, default to all
+        """
+        with self.__lock:
+            hosts = self.hosts
+            if host_names is not None:
+                queried = [h for h in hosts if h['name'] in host_names]
+            else:
+                queried = hosts
+            collected = self.__collect_all(queried)
+            for host in queried:
+                if host['name'] in collected:
+                    self.__hosts[host['name']] = collected[host['name']]
+                else:
+                    self.__hosts.pop(host['name'], None)
+
+            return self.__render_hosts(list(collected))
+
+    def merge(self, input_paths: List[str]) -> Digraph:
+        """
+        Build the merged graph from the snapshots written by shards.
+
+        No host is queried : the graph is built from the last collected
+        state of each host of the configuration.
+
+        :param input_paths : output directories of the shards
+        """
+        with self.__lock:
+            self.__reset_graph()
+
+            snapshots: Dict[str, HostInfos] = {}
+            for path in input_paths:
+                snapshots.update(load_snapshots(path))
+
+            graphs = {}
+            for host in self.config['hosts']:
+                if host['name'] not in snapshots:
+                    logging.warning('No snapshot for host %s, skipping.',
+                                    host['name'])
+                    continue
+                self.__hosts[host['name']] = snapshots[host['name']]
+                graphs[host['name']] = self.__build_subgraph(
+                    host,
+                    snapshots[host['name']])
+            self.__export_topology()
+            self.__write_reports()
+            self.__render_graph(graphs, True, list(graphs))
+            self.__post_actions()
+            self.__notify()
+
+            return self.__graph
+
+    def replay(self, host_name: str, at: datetime) -> List[str]:
+        """
+        Render the graph of a host as it was at a given time.
+
+        The state is rebuilt from the history, without querying the host,
+        and no action is performed. Return the paths of rendered files.
+
+        :param host_name : name of the host, as in the configuration
+        :param at : time of the state, the last state before it is used
+        """
+        hosts = {host['name']: host for host in self.config['hosts']}
+        if host_name not in hosts:
+            logging.error('Unknown host %s.', host_name)
+            return []
+        with self.__lock:
+            state = HistoryStore(self.__output_path).rebuild(host_name, at)
+            if state is None:
+                logging.error('No history of %s before %s.', host_name, at)
+                return []
+            logging.info('Rendering %s as collected at %s',
+                         host_name, state.collected_at)
+
+            self.__reset_graph()
+            graph = self.__build_subgraph(hosts[host_name], state)
+            stamp = state.collected_at.strftime('%Y%m%dT%H%M%S')
+            path = os.path.join(self.__output_path,
+                                f'{host_name}.{stamp}.dot')
+            return self.__optimizer.render(self.__standalone(graph), path)
+
+    def __render_hosts(self, updated: List[str]) -> Digraph:
+        """
+        Render graphs from the last state of hosts and perform actions.
+
+        :param updated : hosts whose own files must be rendered again
+        """
+        self.__reset_graph()
+
+        graphs = {}
+        for host in self.hosts:
+            if host['name'] not in self.__hosts:
+                continue
+            try:
+                graphs[host['name']] = self.__build_subgraph(
+                    host,
+                    self.__hosts[host['name']])
+                logging.info('Graph for %s successfully built', host['name'])
+            except Exception as e:
+                logging.error('Unknown error while building graph.')
+                logging.exception(e)
+        self.__export_topology()
+        self.__write_reports()
+        self.__render_graph(
+            graphs,
+            self.config['merge'] and self.__shard is None,
+            updated)
+        self.__post_actions()
+        self.__notify()
+
+        return self.__graph
+
+    def __notify(self):
+        """Give generated files to listeners."""
+        for listener in self.__listeners:
+            try:
+                listener(list(self.__generated_files))
+            except Exception as e:
+                logging.error('Unknown error in listener %s.', listener)
+                logging.exception(e)
+
+    def __reset_graph(self):
+        """Create an empty final graph and forget generated files."""
         font_color = self.config['color_scheme'].get('dark_text', '#32384f')
         graph_attr = {
             # Draw straight lines
@@ -117,144 +426,490 @@ class GraphBot:
             node_attr=node_attr,
             format='png'
         )
+        self.__generated_files = []
 
-        graphs = {}
-        for host in self.config['hosts']:
-            try:
-                logging.info('Building graph for host %s...', host['name'])
-                graphs[host['name']] = self.__build_subgraph(host)
-                logging.info('Graph for %s successfully built', host['name'])
-            except docker.errors.APIError as e:
-                logging.error('Error when communicating with %s, skipping.',
-                              host['name'])
-                logging.exception(e)
-            except Exception as e:
-                logging.error('Unknown error while building graph.')
-                logging.exception(e)
-        self.__render_graph(graphs)
-        self.__post_actions()
+    def __export_topology(self):
+        """Export the last state of hosts in the configured data formats."""
+        formats = self.config.get('export', [])
+        if not formats:
+            return
+        exporter = TopologyExporter(
+            self.config['organization'],
+            self.__output_path,
+            self.config.get('hide', []))
+        hosts = [self.__hosts[host['name']] for host in self.config['hosts']
+                 if host['name'] in self.__hosts]
+        excludes = {host['name']: host.get('exclude', [])
+                    for host in self.config['hosts']}
+        self.__generated_files.extend(
+            exporter.export(hosts, excludes, formats))
 
-        return self.__graph
+    def __write_reports(self):
+        """Write fleet-wide reports computed from the last state of hosts."""
+        if not self.config.get('reports', False):
+            return
+        # NumPy is only needed for reports
+        from reports import FleetTable
+
+        hosts = [self.__hosts[host['name']] for host in self.config['hosts']
+                 if host['name'] in self.__hosts]
+        excludes = {host['name']: host.get('exclude', [])
+                    for host in self.config['hosts']}
+        with stage(self.__profiler, 'reports'):
+            report = FleetTable(hosts, excludes).report()
+        path = os.path.join(
+            self.__output_path,
+            f"{self.config['organization']}.fleet_report.json")
+        with open(path, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+        self.__generated_files.append(path)
+        logging.info('Fleet report written to %s', path)
+
+    def __render_graph(self,
+                       graphs: Dict[str, Digraph],
+                       merge: bool,
+                       updated: List[str]):
+        """
+        Render one or several graphs in the configured output formats.
+
+        :param graphs : graph of each host
+        :param merge : whether to render a single graph for all hosts
+        :param updated : hosts whose own files must be rendered again
+        """
+        formats = self.config.get('formats', ['png'])
+        viewer = None
+        if 'html' in formats:
+            viewer = HTMLViewer(self.config['organization'],
+                                self.__output_path)
 
-    def __render_graph(self, graphs: Dict[str, Digraph]):
-        """Render one or several graphs in PNG format from a list of graphs."""
         for host_name, graph in graphs.items():
             # If we are asked to make a big picture, just
             # add each graph as a subgraph
-            if self.config['merge']:
+            if merge:
                 self.__graph.subgraph(graph=graph)
             # Otherwise, replace old graph with new graph
             # and render it immediately
-            else:
+            elif 'png' in formats and host_name in updated:
                 self.__graph.body = graph.body
                 path = os.path.join(self.__output_path, f'{host_name}.dot')
-                self.__graph.render(path)
-                self.__generated_files.append(f'{path}.png')
+                self.__generated_files.extend(
+                    self.__optimizer.render(self.__graph, path))
+
+            # The viewer always needs one SVG per host, loaded on demand
+            if viewer is not None:
+                path = os.path.join(self.__output_path, f'{host_name}.dot')
+                if host_name in updated:
+                    self.__write_svg(self.__standalone(graph), f'{path}.svg')
+                containers = self.__containers.get(host_name, [])
+                viewer.add_host(
+                    host_name,
+                    f'{path}.svg',
+                    containers,
+                    {c.name: node_name(c.name, host_name) for c in containers}
+                )
+
+        # Relations between hosts only make sense in the merged graph
+        if merge and self.config.get('cross_host_edges', False):
+            fleet = FleetIndex(
+                self.__hosts,
+                {name: self.__containers[name] for name in graphs})
+            fleet.draw(self.__graph, self.config['color_scheme'])
 
-        if self.config['merge']:
+        if merge and 'png' in formats:
             path = os.path.join(
                 self.__output_path,
                 f"{self.config['organization']}.dot")
-            self.__graph.render(path)
-            self.__generated_files.append(f'{path}.png')
+            self.__generated_files.extend(
+                self.__optimizer.render(self.__graph, path))
             logging.info("Global rendering is successful !")
 
         legend_path = os.path.join(self.__output_path, 'legend.dot')
-        self.__generated_files.append(f'{legend_path}.png')
-        self.legend.render(legend_path)
+        if 'png' in formats:
+            self.__generated_files.extend(
+                self.__optimizer.render(self.legend, legend_path))
+        if viewer is not None:
+            self.__write_svg(self.legend, f'{legend_path}.svg')
+            self.__generated_files.append(viewer.write(f'{legend_path}.svg'))
+            logging.info("HTML viewer rendering is successful !")
         logging.info("Legend rendering is successful !")
 
+    def __standalone(self, graph: Digraph) -> Digraph:
+        """Return a graph with the attributes of the final graph and a body."""
+        return Digraph(
+            name=self.__graph.name,
+            comment=self.__graph.comment,
+            graph_attr=self.__graph.graph_attr,
+            node_attr=self.__graph.node_attr,
+            body=list(graph.body)
+        )
+
+    def __write_svg(self, graph: Digraph, path: str):
+        """
+        Render a graph in SVG format and remember the file for actions.
+
+        The DOT source is written next to the image, as Graphviz does
+        for PNG files, e.g. "host.dot" for "host.dot.svg".
+
+        :param graph : graph to render
+        :param path : path of the SVG file
+        """
+        name = os.path.basename(path)
+        with stage(self.__profiler, f'serialize.{name}'):
+            source = graph.source.encode(graph.encoding)
+        with open(os.path.splitext(path)[0], 'wb') as dot:
+            dot.write(source)
+        with stage(self.__profiler, f'render.{name}'):
+            content = pipe(graph.engine, 'svg', source)
+        with open(path, 'wb') as svg:
+            svg.write(content)
+        self.__generated_files.append(path)
+
     def __post_actions(self):
         """Perform eventuals actions after rendering the files."""
-        for action in self.config.get('actions', []):
-            # Upload generated PNG
-            if action['type'] == 'webdav':
-                web_dav = WebDAVUploader(
-                    action['hostname'],
-                    action['login'],
-                    action['password'],
-                    action['remote_path']
+        backends = []
+        for index, action in enumerate(self.config.get('actions', [])):
+            if action['type'] not in ACTIONS:
+                logging.error('Unknown action type %s, skipping.',
+                              action['type'])
+                continue
+            try:
+                backend = load_action(action['type']).from_config(action)
+            except Exception as e:
+                logging.error('Invalid %s action, skipping.', action['type'])
+                logging.exception(e)
+                continue
+            backend.stage = functools.partial(
+                stage, self.__profiler, f"action.{index}.{action['type']}")
+            if self.__profiler is not None:
+                # Only one stage can be profiled at a time
+                backend.concurrency = 1
+            backends.append(backend)
+        if backends:
+            # Upload generated files to all targets at the same time
+            asyncio.run(self.__perform_actions(backends))
+
+    async def __perform_actions(self, backends: List[Action]):
+        """
+        Perform actions concurrently, each one within its timeout.
+
+        Actions are performed one after the other when profiling.
+
+        :param backends : actions to perform
+        """
+        async def perform(backend: Action):
+            try:
+                await asyncio.wait_for(
+                    self.__perform_action(backend), backend.timeout)
+            except asyncio.TimeoutError:
+                logging.error('%s did not complete within %s seconds.',
+                              backend.target, backend.timeout)
+            except Exception as e:
+                logging.error('Unknown error while uploading to %s.',
+                              backend.target)
+                logging.exception(e)
+            finally:
+                try:
+                    # Threads cannot be interrupted, but their clients
+                    # time out : never close a client still in use
+                    await backend.wait_calls()
+                    await backend.close()
+                except Exception as e:
+                    logging.error('Error closing %s.', backend.target)
+                    logging.exception(e)
+
+        if self.__profiler is not None:
+            # Only one stage can be profiled at a time
+            for backend in backends:
+                await perform(backend)
+        else:
+            await asyncio.gather(*[perform(backend) for backend in backends])
+
+    async def __perform_action(self, backend: Action):
+        """Prepare an action, then upload the generated files."""
+        await backend.prepare()
+        await backend.upload(list(self.__generated_files))
+
+    def __collect_all(self,
+                      hosts: List[Dict[str, Any]]) -> Dict[str, HostInfos]:
+        """
+        Query hosts concurrently and return their state, indexed by name.
+
+        Hosts are given the latency budget of the configuration to answer,
+        if any, from the start of their own query : hosts waiting for a
+        worker are not late. When the cache policy is "reuse", the last good state of
+        a host which failed or which is too slow is used instead, so that
+        the graph is complete. Otherwise, such a host is skipped.
+
+        :param hosts : hosts to query
+        """
+        import docker
+
+        # Fail now rather than when connecting to the hosts
+        self.__check_tls_files(hosts)
+
+        cache_config = self.config.get('cache', {})
+        budget = cache_config.get('latency_budget')
+        reuse = cache_config.get('policy', 'drop') == 'reuse'
+
+        # Do not query too many hosts at once
+        workers = min(len(hosts), self.config.get('concurrency', len(hosts)))
+        if self.__profiler is not None:
+            # Python 3.12+ only allows one active profiler at a time, so
+            # that profiled hosts are queried one after the other
+            workers = 1
+        executor = ThreadPoolExecutor(max_workers=max(workers, 1))
+        futures = {}
+        # Set when the host is late, so that its thread stops early
+        abandoned = {host['name']: threading.Event() for host in hosts}
+        # Monotonic time at which the query of each host started
+        started: Dict[str, float] = {}
+
+        def collect(host: Dict[str, Any]) -> HostInfos:
+            started[host['name']] = time.monotonic()
+            return self.__collect(host, abandoned[host['name']])
+
+        for host in hosts:
+            logging.info('Building graph for host %s...', host['name'])
+            futures[executor.submit(collect, host)] = host
+
+        pending, late = set(futures), set()
+        while pending:
+            timeout = None
+            if budget is not None:
+                # Wake up at the deadline of the first running host, or
+                # after a whole budget if no host started yet
+                deadlines = [started[futures[f]['name']] + budget
+                             for f in pending if futures[f]['name'] in started]
+                timeout = max(0, min(deadlines, default=time.monotonic()
+                                     + budget) - time.monotonic())
+            _, pending = wait(pending, timeout=timeout,
+                              return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for future in list(pending):
+                start = started.get(futures[future]['name'])
+                if start is not None and now >= start + budget:
+                    late.add(future)
+                    pending.remove(future)
+                    with self.__clients_lock:
+                        abandoned[futures[future]['name']].set()
+                        self.__clients.pop(futures[future]['name'], None)
+        # Do not wait for late hosts, their client timeout ends them
+        executor.shutdown(wait=False)
+
+        collected = {}
+        for future, host in futures.items():
+            if future in late:
+                logging.error('%s did not answer within %s seconds.',
+                              host['name'], budget)
+            else:
+                try:
+                    collected[host['name']] = future.result()
+                    self.__cache.store(collected[host['name']])
+                    continue
+                except docker.errors.APIError as e:
+                    logging.error('Error when communicating with %s.',
+                                  host['name'])
+                    logging.exception(e)
+                except Exception as e:
+                    logging.error('Unknown error while querying %s.',
+                                  host['name'])
+                    logging.exception(e)
+
+            # Connect again next time, in case the connection is broken
+            self.__clients.pop(host['name'], None)
+            cached = self.__cache.get(host['name']) if reuse else None
+            if cached is None:
+                logging.error('Skipping %s.', host['name'])
+            else:
+                logging.warning('Using stale state of %s collected at %s.',
+                                host['name'], cached.collected_at)
+                collected[host['name']] = cached
+
+        # Only freshly collected states are part of the history
+        for host_infos in collected.values():
+            if self.__history is None or host_infos.stale:
+                continue
+            try:
+                self.__history.append(host_infos)
+            except Exception as e:
+                logging.error('Error recording history of %s.',
+                              host_infos.name)
+                logging.exception(e)
+        return collected
+
+    def __history_store(self) -> Optional[HistoryStore]:
+        """Return the history store of the configuration, if enabled."""
+        if 'history' not in self.config:
+            return None
+        return HistoryStore(self.__output_path, **self.config['history'])
+
+    def __collect(self,
+                  host: Dict[str, Any],
+                  abandoned: threading.Event) -> HostInfos:
+        """
+        Query a specific host and return its collected state.
+
+        :param host : configuration of the host
+        :param abandoned : set once the host is late, the state is then
+                           dropped, so the query stops at the next step
+        """
+        with stage(self.__profiler, f"collect.{host['name']}"):
+            # Network libraries are only needed when hosts are queried
+            import docker
+            import dns.resolver
+            from urllib.request import urlopen
+
+            # Slow hosts must not outlive the latency budget for long
+            budget = self.config.get('cache', {}).get('latency_budget')
+            client_args = {}
+            if budget is not None:
+                client_args['timeout'] = math.ceil(budget)
+
+            docker_client = self.__clients.get(host['name'])
+            if host['url'] == 'localhost':
+                if docker_client is None:
+                    docker_client = docker.from_env(**client_args)
+                # Do not use private IP
+                addresses = [
+                    urlopen('https://wtfismyip.com/text', timeout=budget)
+                    .read()
+                    .decode("utf-8")
+                    .replace('\n', '')
+                ]
+            elif docker_client is None:
+                # Build configuration to securely exchange with Docker socket
+                cert_p = os.path.join(
+                    self.__certs_path,
+                    host['tls_config']['cert'])
+                key_p = os.path.join(
+                    self.__certs_path,
+                    host['tls_config']['key'])
+                ca_p = os.path.join(
+                    self.__certs_path,
+                    host['tls_config']['ca_cert'])
+                tls_config = docker.tls.TLSConfig(
+                    client_cert=(cert_p, key_p),
+                    verify=ca_p
                 )
-                web_dav.upload(self.__generated_files)
-            elif action['type'] == 'sftp':
-                sftp_client = SFTPUploader(
-                    action['hostname'],
-                    action['port'],
-                    action['login'],
-                    action['password'],
-                    action['remote_path']
+                docker_client = docker.DockerClient(
+                    base_url=f"{host['url']}:{host['port']}",
+                    tls=tls_config,
+                    **client_args
                 )
-                sftp_client.upload(self.__generated_files)
-
-    def __build_subgraph(self, host: Dict[str, Any]) -> Digraph:
-        """Query a specific host and return its built graph."""
-        host_name = f"{host['name']} ("
-        if host['url'] == 'localhost':
-            docker_client = docker.from_env()
-            # Do not use private IP
-            host_name += \
-                urlopen('https://wtfismyip.com/text') \
-                .read() \
-                .decode("utf-8") \
-                .replace('\n', '')
-        else:
-            # Build configuration to securely exchange with Docker socket
-            cert_p = os.path.join(
-                self.__certs_path,
-                host['tls_config']['cert'])
-            key_p = os.path.join(
-                self.__certs_path,
-                host['tls_config']['key'])
-            ca_p = os.path.join(
-                self.__certs_path,
-                host['tls_config']['ca_cert'])
-            tls_config = docker.tls.TLSConfig(
-                client_cert=(cert_p, key_p),
-                verify=ca_p
+            if host['url'] != 'localhost':
+                # Not building for localhost, get public IP from DNS servers
+                # Sort them as DNS servers may answer in any order
+                resolver = dns.resolver.Resolver()
+                if budget is not None:
+                    resolver.lifetime = budget
+                addresses = sorted(
+                    result.address
+                    for result in resolver.query(host['url']))
+
+            # Build a nice name, with hostname and public IP
+            # The date is added by GraphBuilder
+            host_label = f"{host['name']} ({', '.join(addresses)})"
+            if host['url'] != 'localhost':
+                addresses.insert(0, host['url'])
+
+            # Check if the Docker daemon is accessible with current params
+            # If yes, get all needed informations about running containers
+            docker_client.ping()
+            with self.__clients_lock:
+                # The main thread already dropped the client of a late host
+                if abandoned.is_set():
+                    raise TimeoutError(f"{host['name']} is late, giving up")
+                self.__clients[host['name']] = docker_client
+            docker_info = DockerInfo(docker_client)
+            containers = docker_info.update_containers()
+            if abandoned.is_set():
+                raise TimeoutError(f"{host['name']} is late, giving up")
+            if 'stats' in self.config:
+                from stats import StatsCollector
+                docker_info.update_stats(
+                    StatsCollector(**self.config['stats']))
+            return HostInfos(
+                host['name'],
+                host_label,
+                containers,
+                docker_info.traefik_container,
+                docker_info.traefik_source_port,
+                addresses=addresses
             )
-            docker_client = docker.DockerClient(
-                base_url=f"{host['url']}:{host['port']}",
-                tls=tls_config
+
+    def __build_subgraph(self,
+                         host: Dict[str, Any],
+                         host_infos: HostInfos) -> Digraph:
+        """Return the built graph of a host from its collected state."""
+        with stage(self.__profiler, f"build.{host['name']}"):
+            builder = GraphBuilder(
+                host_infos,
+                self.config['color_scheme'],
+                host.get('exclude', []),
+                self.config.get('hide', []),
+                host.get('default_network', None),
+                not self.config.get('stable_output', False)
             )
-            # Not building for localhost, get public IP from DNS servers
-            for result in dns.resolver.query(host['url']):
-                host_name += f'{result.address}'
-
-        # Build a nice name, with hostname, public IP and generated date
-        host_name += f') at {datetime.now().strftime("%m/%d/%Y %H:%M")}'
-
-        # Check if the Docker daemon is accessible with current params
-        # If yes, starting graph building process
-        docker_client.ping()
-        builder = GraphBuilder(
-            docker_client,
-            self.config['color_scheme'],
-            host['name'],
-            host_name,
-            host.get('exclude', []),
-            self.config.get('hide', []),
-            host.get('default_network', None)
-        )
-        return builder.graph
+            graph = builder.graph
+        self.__containers[host['name']] = builder.containers
+        return graph
 
-    def __check_config(self) -> Optional[str]:
+    def __read_config(self) -> Dict[str, Any]:
+        """Read the configuration file, validate it and return it."""
+        try:
+            mtime = os.stat(self.__config_file).st_mtime_ns
+            with open(self.__config_file) as fd:
+                config = json.load(fd)
+        except (OSError, IOError, json.JSONDecodeError) as e:
+            logging.error('Failed to read configuration.')
+            raise e
+
+        self.__check_config(config)
+        self.__config_mtime = mtime
+        return config
+
+    def __check_config(self, config: Dict[str, Any]):
         """Perform syntaxic and logic checks of the configuration."""
-        with open(self.__get_real_path('schema.json')) as schema:
-            try:
-                jsonschema.validate(self.config, json.load(schema))
-                return None
-            except (ValidationError, SchemaError) as schema_err:
-                logging.error('Invalid configuration!')
-                raise schema_err
+        from jsonschema.exceptions import ValidationError, SchemaError
+
+        try:
+            schema_validator().validate(config)
+        except (ValidationError, SchemaError) as schema_err:
+            logging.error('Invalid configuration!')
+            raise schema_err
 
         # Ensure that there is not duplicate hostnames
         # as the name of nodes, which must be unique
         # is based on this property
-        hosts = [host['name'] for host in self.config['hosts']]
+        hosts = [host['name'] for host in config['hosts']]
         unique_hosts = set(hosts)
         if len(hosts) != len(unique_hosts):
             raise Exception('Two hosts cannot have the same name')
 
+    def __check_tls_files(self, hosts: List[Dict[str, Any]]):
+        """
+        Check that the TLS files of remote hosts exist.
+
+        Only commands querying hosts need them, e.g. shards can be merged
+        on a machine without any certificate.
+
+        :param hosts : hosts about to be queried
+        """
+        for host in hosts:
+            if host['url'] == 'localhost':
+                continue
+            for path in host['tls_config'].values():
+                if not os.path.isfile(os.path.join(self.__certs_path, path)):
+                    raise Exception(f"TLS file {path} of host "
+                                    f"{host['name']} does not exist")
+
+    @staticmethod
+    def __changed(previous: Dict[str, Any],
+                  current: Dict[str, Any],
+                  settings: List[str]) -> bool:
+        """Return whether one of the given settings has a new value."""
+        return any(previous.get(key) != current.get(key) for key in settings)
+
     @staticmethod
     def __get_real_path(relative_path: str) -> str:
         """Return absolute path of a path starting in the current directory."""
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Logic to summarize the collected state of all hosts in reports."""
+
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+import numpy
+
+from docker_info import HostInfos
+
+
+class FleetTable:
+    """
+    Columnar table of the containers of all hosts, with fleet reports.
+
+    Containers are walked once to fill flat arrays : one row per
+    container, one row per published port and one row per mounted
+    volume. Strings are encoded as integer codes, so that reports are
+    computed with a few NumPy sorts and counts rather than Python loops
+    over containers, which matters for fleets of thousands of containers.
+    """
+
+    def __init__(self,
+                 hosts: List[HostInfos],
+                 excludes: Dict[str, List[str]]):
+        """
+        Build the table from the state of hosts.
+
+        :param hosts : state of hosts to summarize
+        :param excludes : names of containers to exclude of each host
+        """
+        host_names, labels, images, urls = [], [], [], []
+        # Container row and published port ("8080/tcp") of each port row
+        port_rows, ports = [], []
+        # Container row and volume name of each volume row
+        volume_rows, volumes = [], []
+        for host in hosts:
+            exclude = excludes.get(host.name, [])
+            for cont in host.containers:
+                if cont.name in exclude:
+                    continue
+                row = len(labels)
+                host_names.append(host.name)
+                labels.append(f'{host.name}/{cont.name}')
+                images.append(cont.image)
+                urls.append(cont.url or '')
+                published = {
+                    f"{host_port}/{exposed.partition('/')[2] or 'tcp'}"
+                    for exposed, host_ports in cont.ports.items()
+                    for host_port in host_ports
+                }
+                port_rows.extend([row] * len(published))
+                ports.extend(sorted(published))
+                volume_rows.extend([row] * len(cont.volumes))
+                volumes.extend(sorted(cont.volumes))
+
+        # All hosts are counted, even without containers
+        self.host_names = numpy.unique(
+            numpy.asarray([host.name for host in hosts], dtype=str))
+        self.host = numpy.searchsorted(
+            self.host_names,
+            numpy.asarray(host_names, dtype=str)).astype(numpy.int64)
+        self.images, self.image = self.__encode(images)
+        self.labels = numpy.asarray(labels, dtype=str)
+        self.urls = numpy.asarray(urls, dtype=str)
+        self.port_rows = numpy.asarray(port_rows, dtype=numpy.int64)
+        self.ports, self.port = self.__encode(ports)
+        self.volume_rows = numpy.asarray(volume_rows, dtype=numpy.int64)
+        self.volumes, self.volume = self.__encode(volumes)
+
+    def __len__(self) -> int:
+        """Return the number of containers."""
+        return len(self.labels)
+
+    def report(self) -> Dict[str, Any]:
+        """Return all reports in a JSON serializable document."""
+        return {
+            'generated_at': datetime.now().isoformat(),
+            'hosts': len(self.host_names),
+            'containers': len(self),
+            'images': self.images_report(),
+            'ports': self.ports_report(),
+            'volumes': self.volumes_report(),
+            'routes': self.routes_report()
+        }
+
+    def images_report(self) -> Dict[str, Dict[str, int]]:
+        """Return the number of containers and hosts running each image."""
+        containers = numpy.bincount(self.image, minlength=len(self.images))
+        hosts = self.__distinct_hosts(self.image, self.host, len(self.images))
+        # Most used images first
+        order = numpy.argsort(-containers, kind='stable')
+        return {
+            str(self.images[i]): {
+                'containers': int(containers[i]),
+                'hosts': int(hosts[i])
+            }
+            for i in order
+        }
+
+    def ports_report(self) -> Dict[str, Any]:
+        """
+        Return the usage of each published port, and its collisions.
+
+        A port collides when it is published by several containers,
+        on the same host (on different addresses) or on several hosts,
+        which prevents moving these containers between hosts.
+        """
+        port_hosts = self.host[self.port_rows]
+        containers = numpy.bincount(self.port, minlength=len(self.ports))
+        hosts = self.__distinct_hosts(self.port, port_hosts, len(self.ports))
+        colliding = containers[self.port] > 1
+        collisions = self.__groups(self.port[colliding],
+                                   self.labels[self.port_rows[colliding]])
+        return {
+            'usage': {
+                str(port): {
+                    'containers': int(containers[i]),
+                    'hosts': int(hosts[i])
+                }
+                for i, port in enumerate(self.ports)
+            },
+            'collisions': {
+                str(self.ports[code]): members
+                for code, members in collisions.items()
+            }
+        }
+
+    def volumes_report(self) -> Dict[str, Dict[str, List[str]]]:
+        """Return volumes mounted by several containers of a host."""
+        volume_hosts = self.host[self.volume_rows]
+        # Volumes are local to a host, group them by host and name
+        keys = volume_hosts * max(len(self.volumes), 1) + self.volume
+        shared = numpy.bincount(keys)[keys] > 1
+        groups = self.__groups(keys[shared],
+                               self.labels[self.volume_rows[shared]])
+        report: Dict[str, Dict[str, List[str]]] = {}
+        for key, members in groups.items():
+            host, volume = divmod(key, max(len(self.volumes), 1))
+            report.setdefault(str(self.host_names[host]), {})[
+                str(self.volumes[volume])] = members
+        return report
+
+    def routes_report(self) -> Dict[str, Dict[str, Any]]:
+        """Return the number of Traefik routes, and their URL, per host."""
+        routed = self.urls != ''
+        routes = numpy.bincount(self.host[routed],
+                                minlength=len(self.host_names))
+        urls = self.__groups(self.host[routed], self.urls[routed])
+        return {
+            str(host): {
+                'routes': int(routes[i]),
+                'urls': sorted(urls.get(i, []))
+            }
+            for i, host in enumerate(self.host_names)
+        }
+
+    @staticmethod
+    def __encode(values: List[str]) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """Return the sorted distinct values, and the code of each value."""
+        distinct, codes = numpy.unique(numpy.asarray(values, dtype=str),
+                                       return_inverse=True)
+        return distinct, codes.astype(numpy.int64).ravel()
+
+    @staticmethod
+    def __distinct_hosts(codes: numpy.ndarray,
+                         hosts: numpy.ndarray,
+                         size: int) -> numpy.ndarray:
+        """
+        Return the number of distinct hosts of each code.
+
+        :param codes : code of each row, e.g. an image
+        :param hosts : host code of each row
+        :param size : number of distinct codes
+        """
+        if not len(codes):
+            return numpy.zeros(size, dtype=numpy.int64)
+        width = int(hosts.max()) + 1
+        pairs = numpy.unique(codes * width + hosts)
+        return numpy.bincount(pairs // width, minlength=size)
+
+    @staticmethod
+    def __groups(keys: numpy.ndarray,
+                 values: numpy.ndarray) -> Dict[int, List[str]]:
+        """
+        Return the values of each key, sorted.
+
+        :param keys : integer key of each row
+        :param values : value of each row
+        """
+        if not len(keys):
+            return {}
+        order = numpy.lexsort((values, keys))
+        keys, values = keys[order], values[order]
+        bounds = numpy.flatnonzero(numpy.diff(keys)) + 1
+        return {
+            int(group_keys[0]): [str(v) for v in group_values]
+            for group_keys, group_values in zip(numpy.split(keys, bounds),
+                                                numpy.split(values, bounds))
+        }
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Logic to refresh hosts when they are due, instead of all at once."""
+
+import heapq
+import logging
+import random
+import threading
+import time
+
+from typing import Any, Dict, List, Tuple
+
+from render import GraphBot
+
+# Default refresh interval of a host, in seconds
+DEFAULT_INTERVAL = 3600
+# Default delay under which due hosts are refreshed together, in seconds
+DEFAULT_COALESCE = 60
+# Default delay between two checks of the configuration file, in seconds
+DEFAULT_WATCH = 10
+
+
+class Scheduler:
+    """
+    Refresh each host of a GraphBot according to its own interval.
+
+    A random jitter is added to each deadline so that hosts, and the
+    upload targets, are not all hit at the same instant. Hosts due
+    within the coalescing delay are refreshed in a single batch, so
+    that the merged graph is rendered and the actions are performed
+    only once for all of them.
+
+    The configuration file is watched while waiting : new hosts and
+    hosts with new connection settings are queried at once, while other
+    changes are applied by GraphBot without querying hosts.
+    """
+
+    def __init__(self, bot: GraphBot, built: bool = False):
+        """
+        Initialize the scheduler from the "schedule" configuration.
+
+        :param bot : GraphBot refreshing the hosts
+        :param built : True if all hosts were just refreshed, so that
+                       their first refresh is after their interval
+        """
+        self.bot = bot
+        self.__queue: List[Tuple[float, str]] = []
+        self.__wake = threading.Event()
+        self.__stopped = False
+
+        # Spread the first refresh of hosts over the jitter
+        now = time.monotonic()
+        for host in self.bot.hosts:
+            due = now + self.__interval(host['name']) if built else now
+            self.__push(host['name'], due)
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        """Return the "schedule" section of the configuration."""
+        return self.bot.config.get('schedule', {})
+
+    def run(self):
+        """Refresh hosts when they are due, until stop() is called."""
+        logging.info('Scheduling refresh of %d hosts', len(self.__queue))
+        while not self.__stopped:
+            # Sleep until the next deadline or the next configuration
+            # check, unless woken up
+            watch = self.config.get('watch_interval', DEFAULT_WATCH)
+            if self.__queue:
+                watch = min(watch, self.__queue[0][0] - time.monotonic())
+            if self.__wake.wait(max(0, watch)):
+                self.__wake.clear()
+                continue
+
+            # Only read and validate the configuration if it changed
+            self.__reload()
+            if not self.__queue or self.__queue[0][0] > time.monotonic():
+                continue
+
+            # Coalesce all hosts due soon in a single refresh
+            horizon = time.monotonic() + \
+                self.config.get('coalesce', DEFAULT_COALESCE)
+            batch = []
+            while self.__queue and self.__queue[0][0] <= horizon:
+                batch.append(heapq.heappop(self.__queue)[1])
+            logging.info('Refreshing %s', ', '.join(batch))
+            try:
+                self.bot.refresh(batch)
+            except Exception as e:
+                logging.error('Unknown error while refreshing %s.', batch)
+                logging.exception(e)
+
+            now = time.monotonic()
+            for host_name in batch:
+                self.__push(host_name, now + self.__interval(host_name))
+
+    def stop(self):
+        """Stop the scheduler after the current refresh, if any."""
+        self.__stopped = True
+        self.__wake.set()
+
+    def __reload(self):
+        """Apply changes of the configuration to the queue of hosts."""
+        try:
+            queried = self.bot.reload_config()
+        except Exception as e:
+            logging.error('Unknown error while applying configuration.')
+            logging.exception(e)
+            return
+        if queried is None:
+            return
+
+        # Forget removed hosts and hosts to query at once
+        host_names = {host['name'] for host in self.bot.hosts}
+        self.__queue = [(due, name) for due, name in self.__queue
+                        if name in host_names and name not in queried]
+        heapq.heapify(self.__queue)
+
+        scheduled = {name for _, name in self.__queue}
+        now = time.monotonic()
+        for host_name in host_names - scheduled:
+            logging.info('Scheduling %s for immediate refresh', host_name)
+            heapq.heappush(self.__queue, (now, host_name))
+
+    def __push(self, host_name: str, due: float):
+        """
+        Schedule a refresh of a host, with jitter.
+
+        :param host_name : name of the host, as in the configuration
+        :param due : monotonic time of the refresh, before jitter
+        """
+        jitter = random.uniform(0, self.config.get('jitter', 0))
+        heapq.heappush(self.__queue, (due + jitter, host_name))
+
+    def __interval(self, host_name: str) -> float:
+        """
+        Return the refresh interval of a host, in seconds.
+
+        :param host_name : name of the host, as in the configuration
+        """
+        for host in self.bot.hosts:
+            if host['name'] == host_name:
+                return host.get(
+                    'refresh_interval',
+                    self.config.get('interval', DEFAULT_INTERVAL))
+        return self.config.get('interval', DEFAULT_INTERVAL)
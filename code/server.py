@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Logic to serve the latest graphs and topology over HTTP."""
+
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from render import GraphBot
+
+# Content types unknown to the mimetypes module
+CONTENT_TYPES = {
+    '.dot': 'text/vnd.graphviz',
+    '.ndjson': 'application/x-ndjson',
+    '.graphml': 'application/graphml+xml',
+    '.parquet': 'application/vnd.apache.parquet'
+}
+
+
+class ArtifactCache:
+    """
+    Keep the latest generated files in memory, with their ETag.
+
+    Files are read once after each rendering, so that requests never
+    touch the disk. Files of hosts which were not rendered again are
+    kept from previous renderings.
+    """
+
+    def __init__(self):
+        """Initialize an empty cache."""
+        self.__files: Dict[str, Tuple[bytes, str, str]] = {}
+        self.__lock = threading.Lock()
+
+    def update(self, paths: List[str]):
+        """
+        Read generated files, and the DOT source of images, in memory.
+
+        :param paths : paths of the generated files
+        """
+        files = {}
+        for path in paths:
+            # Graphviz writes the DOT source next to the image
+            dot_path, extension = os.path.splitext(path)
+            candidates = [path]
+            if extension in ('.png', '.svg') and dot_path.endswith('.dot'):
+                candidates.append(dot_path)
+            for candidate in candidates:
+                try:
+                    with open(candidate, 'rb') as artifact:
+                        files[os.path.basename(candidate)] = \
+                            self.entry(candidate, artifact.read())
+                except OSError as e:
+                    logging.error('Cannot read %s, not served.', candidate)
+                    logging.exception(e)
+        with self.__lock:
+            self.__files.update(files)
+
+    def get(self, name: str) -> Tuple[bytes, str, str]:
+        """
+        Return the content, ETag and content type of a file, if known.
+
+        :param name : name of the file
+        """
+        with self.__lock:
+            return self.__files.get(name)
+
+    @property
+    def names(self) -> List[str]:
+        """Return the names of all files, sorted."""
+        with self.__lock:
+            return sorted(self.__files)
+
+    @staticmethod
+    def entry(name: str, content: bytes) -> Tuple[bytes, str, str]:
+        """
+        Return a cache entry (content, ETag and content type).
+
+        :param name : name of the file, used to guess its type
+        :param content : content of the file
+        """
+        extension = os.path.splitext(name)[1]
+        content_type = CONTENT_TYPES.get(extension) \
+            or mimetypes.guess_type(name)[0] \
+            or 'application/octet-stream'
+        etag = f'"{hashlib.sha1(content).hexdigest()}"'
+        return content, etag, content_type
+
+
+class GraphServer(ThreadingHTTPServer):
+    """
+    Serve the files generated by a GraphBot from memory.
+
+    Routes :
+    * /<file> : a generated file (image, DOT source, viewer, export)
+    * / : the HTML viewer if generated, otherwise the list of files
+    * /topology.json and /topology/<host>.json : last state of hosts
+    * POST /refresh?host=<host> : query a host again and render its graphs
+
+    Responses have an ETag, and requests with a matching If-None-Match
+    header get an empty "304 Not Modified" response.
+    """
+
+    def __init__(self, bot: GraphBot, bind: str = '127.0.0.1',
+                 port: int = 8080):
+        """
+        Listen on an address and keep files of each rendering of the bot.
+
+        :param bot : GraphBot generating the files
+        :param bind : address to listen on
+        :param port : port to listen on
+        """
+        super().__init__((bind, port), GraphRequestHandler)
+        self.bot = bot
+        self.cache = ArtifactCache()
+        self.bot.add_listener(self.cache.update)
+
+
+class GraphRequestHandler(BaseHTTPRequestHandler):
+    """Answer requests of a GraphServer."""
+
+    server: GraphServer
+
+    def do_GET(self):
+        """Route a request to a file or the topology."""
+        url = urlparse(self.path)
+        path = url.path.strip('/')
+
+        if path == 'refresh':
+            # Refreshing queries hosts, it must not be done by a link
+            self.send_error(405, 'Use POST to refresh hosts')
+        elif path == 'topology.json':
+            self.__send_json(self.server.bot.topology())
+        elif path.startswith('topology/') and path.endswith('.json'):
+            host_name = path[len('topology/'):-len('.json')]
+            if host_name not in self.server.bot.states:
+                self.send_error(404, f'Unknown host {host_name}')
+                return
+            self.__send_json(self.server.bot.topology(host_name))
+        elif path == '':
+            if self.server.cache.get('index.html') is not None:
+                self.__send(self.server.cache.get('index.html'))
+            else:
+                self.__send_json({'files': self.server.cache.names})
+        elif self.server.cache.get(path) is not None:
+            self.__send(self.server.cache.get(path))
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        """Route a request to a refresh, the only route changing state."""
+        url = urlparse(self.path)
+        if url.path.strip('/') == 'refresh':
+            self.__refresh(parse_qs(url.query).get('host', []))
+        else:
+            self.send_error(405, 'Only /refresh accepts POST')
+
+    def log_message(self, format, *args):
+        """Log requests with the logging module rather than on stderr."""
+        logging.debug('%s - %s', self.address_string(), format % args)
+
+    def __refresh(self, host_names: List[str]):
+        """
+        Query hosts again and render graphs, then list generated files.
+
+        :param host_names : names of the hosts to refresh
+        """
+        if not host_names:
+            self.send_error(400, 'Missing host parameter')
+            return
+        known = {host['name'] for host in self.server.bot.hosts}
+        unknown = [name for name in host_names if name not in known]
+        if unknown:
+            self.send_error(404, f'Unknown hosts {unknown}')
+            return
+        self.server.bot.refresh(host_names)
+        states = self.server.bot.states
+        self.__send_json({
+            'refreshed': {
+                name: states[name].collected_at.isoformat()
+                for name in host_names if name in states
+            },
+            'files': self.server.cache.names
+        })
+
+    def __send_json(self, document: Dict):
+        """Send a JSON document, with an ETag."""
+        content = json.dumps(document).encode('utf-8')
+        self.__send(ArtifactCache.entry('document.json', content))
+
+    def __send(self, entry: Tuple[bytes, str, str]):
+        """Send a cache entry, or nothing if the client already has it."""
+        content, etag, content_type = entry
+        if etag in self.headers.get('If-None-Match', ''):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(content)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Logic to store the collected state of hosts in the output directory."""
+
+import glob
+import json
+import logging
+import os
+
+from typing import Dict
+
+from docker_info import HostInfos
+
+# Sub-directory of the output directory containing snapshots
+SNAPSHOT_DIRECTORY = 'snapshots'
+
+
+def snapshot_path(output_path: str, host_name: str) -> str:
+    """
+    Return the path of the snapshot of a host.
+
+    :param output_path : output directory
+    :param host_name : name of the host, as in the configuration
+    """
+    return os.path.join(output_path, SNAPSHOT_DIRECTORY, f'{host_name}.json')
+
+
+def save_snapshot(output_path: str, host: HostInfos) -> str:
+    """
+    Write the snapshot of a host and return its path.
+
+    The file is replaced atomically so that a concurrent merge never
+    reads a partial snapshot.
+
+    :param output_path : output directory
+    :param host : collected state of the host
+    """
+    path = snapshot_path(output_path, host.name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as snapshot:
+        json.dump(host.to_dict(), snapshot)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_snapshots(output_path: str) -> Dict[str, HostInfos]:
+    """
+    Read all snapshots of an output directory, indexed by host name.
+
+    :param output_path : output directory
+    """
+    hosts = {}
+    pattern = os.path.join(output_path, SNAPSHOT_DIRECTORY, '*.json')
+    for path in sorted(glob.glob(pattern)):
+        try:
+            with open(path) as snapshot:
+                host = HostInfos.from_dict(json.load(snapshot))
+            hosts[host.name] = host
+        except (OSError, ValueError, KeyError) as e:
+            logging.error('Invalid snapshot %s, skipping.', path)
+            logging.exception(e)
+    return hosts
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Logic to sample resource usage of all containers of a host at once."""
+
+import logging
+
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import docker
+
+# Default time given to a host to return statistics, in seconds
+DEFAULT_BUDGET = 3
+# Default number of containers sampled at the same time
+DEFAULT_WORKERS = 16
+
+
+class StatsCollector:
+    """
+    Sample CPU, memory and network usage of containers concurrently.
+
+    Docker takes about one second to answer each statistics request, as
+    it measures CPU usage between two samples. Requests are then sent
+    concurrently, and containers which did not answer within the time
+    budget are left without statistics.
+    """
+
+    def __init__(self,
+                 budget: float = DEFAULT_BUDGET,
+                 workers: int = DEFAULT_WORKERS):
+        """
+        Initialize a collector.
+
+        :param budget : time given to all containers to answer, in seconds
+        :param workers : number of containers sampled at the same time
+        """
+        self.budget = budget
+        self.workers = workers
+
+    def collect(self, containers: List['docker.models.containers.Container']
+                ) -> Dict[str, Dict[str, float]]:
+        """
+        Return statistics of containers, indexed by container name.
+
+        :param containers : containers to sample
+        """
+        if not containers:
+            return {}
+        executor = ThreadPoolExecutor(
+            max_workers=min(len(containers), self.workers))
+        futures = {executor.submit(cont.stats, stream=False): cont
+                   for cont in containers}
+        _, late = wait(futures, timeout=self.budget)
+        executor.shutdown(wait=False, cancel_futures=True)
+        if late:
+            logging.warning('No statistics for %d containers within %s '
+                            'seconds.', len(late), self.budget)
+
+        stats = {}
+        for future, cont in futures.items():
+            if future in late:
+                continue
+            try:
+                sample = self.__summarize(future.result())
+            except Exception as e:
+                logging.error('Error getting statistics of %s.', cont.name)
+                logging.exception(e)
+                continue
+            if sample is not None:
+                stats[cont.name] = sample
+        return stats
+
+    @staticmethod
+    def __summarize(raw: Dict[str, Any]) -> Optional[Dict[str, float]]:
+        """
+        Compute usage figures from a raw Docker statistics sample.
+
+        :param raw : answer of the Docker statistics endpoint
+        """
+        cpu, precpu = raw.get('cpu_stats'), raw.get('precpu_stats')
+        memory = raw.get('memory_stats')
+        if not cpu or not precpu or not memory:
+            return None
+
+        # Same computation as "docker stats"
+        cpu_delta = cpu['cpu_usage']['total_usage'] \
+            - precpu['cpu_usage'].get('total_usage', 0)
+        system_delta = cpu.get('system_cpu_usage', 0) \
+            - precpu.get('system_cpu_usage', 0)
+        online_cpus = cpu.get('online_cpus') \
+            or len(cpu['cpu_usage'].get('percpu_usage') or []) or 1
+        cpu_percent = 0.0
+        if cpu_delta > 0 and system_delta > 0:
+            cpu_percent = cpu_delta / system_delta * online_cpus * 100
+
+        # Page cache is not counted as used memory (cgroup v2, then v1)
+        details = memory.get('stats', {})
+        cache = details.get('inactive_file', details.get('cache', 0))
+        networks = raw.get('networks', {}).values()
+        return {
+            'cpu_percent': round(cpu_percent, 2),
+            'memory_usage': memory.get('usage', 0) - cache,
+            'memory_limit': memory.get('limit', 0),
+            'network_rx': sum(n.get('rx_bytes', 0) for n in networks),
+            'network_tx': sum(n.get('tx_bytes', 0) for n in networks)
+        }
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Logic to build an HTML page browsing the SVG graphs of all hosts."""
+
+import html
+import json
+import os
+
+from string import Template
+from typing import Any, Dict, List
+
+from docker_info import ContainerInfos
+
+
+class HTMLViewer:
+    """
+    Write an index page showing the legend and a list of hosts.
+
+    The SVG of a host is only fetched by the browser when the host
+    is selected, so opening the page does not download the whole
+    infrastructure. Containers and images are searchable from an
+    index embedded in the page.
+    """
+
+    def __init__(self, organization: str, output_path: str):
+        """
+        Initialize an empty viewer.
+
+        :param organization : name of the organization, used for titles
+        :param output_path : directory of the SVG files and of the page
+        """
+        self.organization = organization
+        self.output_path = output_path
+        self.__hosts: List[Dict[str, Any]] = []
+
+    def add_host(self,
+                 host_name: str,
+                 svg_path: str,
+                 containers: List[ContainerInfos],
+                 node_names: Dict[str, str]):
+        """
+        Reference the SVG of a host and index its containers.
+
+        :param host_name : name of the host, as in the configuration
+        :param svg_path : path of the SVG file of the host
+        :param containers : containers drawn on the graph of the host
+        :param node_names : name of the graph node of each container
+        """
+        self.__hosts.append({
+            'name': host_name,
+            'file': os.path.basename(svg_path),
+            'containers': [
+                {
+                    'name': cont.name,
+                    'image': cont.image,
+                    'node': node_names[cont.name]
+                }
+                for cont in containers
+            ]
+        })
+
+    def write(self, legend_path: str) -> str:
+        """
+        Write the index page next to the SVG files and return its path.
+
+        :param legend_path : path of the SVG file of the legend
+        """
+        template_path = os.path.join(
+            os.path.dirname(os.path.realpath(__file__)),
+            'viewer.template')
+        with open(template_path) as viewer_template:
+            template = Template(viewer_template.read())
+        page = template.substitute(
+            organization=html.escape(self.organization),
+            hosts=self.__script_json(self.__hosts),
+            legend=self.__script_json(os.path.basename(legend_path))
+        )
+        path = os.path.join(self.output_path, 'index.html')
+        with open(path, 'w') as index:
+            index.write(page)
+        return path
+
+    @staticmethod
+    def __script_json(value: Any) -> str:
+        """
+        Return a value as JSON which can be embedded in a script element.
+
+        A "</" in a string, e.g. "</script>" in an image name, would end
+        the script element, so it is written as "<\\/" instead.
+
+        :param value : JSON serializable value
+        """
+        return json.dumps(value).replace('</', '<\\/')
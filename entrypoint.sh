@@ -19,7 +19,10 @@ if [ ! -z "${LOG_LEVEL}" ]; then
   set -- "$@" "--log-level" "${LOG_LEVEL}"
 fi
 
-if [ -z "${CRON_CONFIG}" ]; then
+if [ ! -z "${SCHEDULE}" ]; then
+  echo "SCHEDULE set, refresh hosts with the built-in scheduler..."
+  exec "$@" schedule
+elif [ -z "${CRON_CONFIG}" ]; then
   echo "CRON_CONFIG not set, launch only once..."
   "$@"
 else
@@ -0,0 +1,8 @@
+# coding=utf-8
+"""Make the modules of the code directory importable by tests."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                os.pardir, 'code'))
@@ -0,0 +1,109 @@
+# coding=utf-8
+"""Tests of the stable output of GraphBuilder."""
+
+import os
+import random
+import subprocess
+import sys
+
+from datetime import datetime
+
+from build import GraphBuilder
+from docker_info import ContainerInfos, HostInfos
+
+COLOR_SCHEME = {
+    'traefik': '#edb591', 'port': '#86c49b', 'link': '#75e9cd',
+    'image': '#e1efe6', 'container': '#ffffff', 'network': '#ffffff',
+    'volume': '#819cd9', 'bind_mount': '#b19cd9', 'host': '#c7ceea',
+    'dark_text': '#32384f', 'bright_text': '#ffffff'
+}
+CONTAINERS = [
+    {
+        'name': 'web', 'image': 'nginx',
+        'ports': {'80/tcp': ['8080', '8081'], '443/tcp': ['8443']},
+        'networks': ['front', 'back', 'monitoring'],
+        'links': ['app'],
+        'bind_mounts': {'/srv/www': ['/usr/share/nginx/html']},
+        'volumes': {'static': ['/static'], 'certs': ['/certs']}
+    },
+    {
+        'name': 'app', 'image': 'python',
+        'ports': {'5000/tcp': ['5000']},
+        'networks': ['back', 'db', 'monitoring'],
+        'links': ['db', 'cache'],
+        'bind_mounts': {},
+        'volumes': {'static': ['/app/static'], 'uploads': ['/uploads']}
+    },
+    {
+        'name': 'db', 'image': 'postgres', 'ports': {},
+        'networks': ['db'], 'links': [],
+        'bind_mounts': {'/srv/backup': ['/backup']},
+        'volumes': {'pgdata': ['/var/lib/postgresql/data']}
+    },
+    {
+        'name': 'cache', 'image': 'redis',
+        'ports': {'6379/tcp': ['6379']},
+        'networks': ['db', 'monitoring'], 'links': [],
+        'bind_mounts': {}, 'volumes': {}
+    }
+]
+
+
+def shuffled(items, rand):
+    """Return a list, or the keys of a dictionary, in random order."""
+    items = list(items)
+    rand.shuffle(items)
+    return items
+
+
+def build_source(seed: int) -> str:
+    """
+    Return the DOT source of a host, with its containers in random order.
+
+    :param seed : seed of the order of containers, networks, ports...
+    """
+    rand = random.Random(seed)
+    containers = []
+    for data in shuffled(CONTAINERS, rand):
+        containers.append(ContainerInfos.from_dict({
+            'name': data['name'],
+            'image': data['image'],
+            'ports': {port: shuffled(data['ports'][port], rand)
+                      for port in shuffled(data['ports'], rand)},
+            'networks': shuffled(data['networks'], rand),
+            'links': shuffled(data['links'], rand),
+            'bind_mounts': {source: data['bind_mounts'][source]
+                            for source in shuffled(data['bind_mounts'],
+                                                   rand)},
+            'volumes': {source: data['volumes'][source]
+                        for source in shuffled(data['volumes'], rand)},
+            'backend_port': None,
+            'url': None
+        }))
+    host = HostInfos('alpha', 'Alpha', containers,
+                     collected_at=datetime(2021, 6, 1, 12, 0))
+    return GraphBuilder(host, COLOR_SCHEME, timestamp=False).graph.source
+
+
+def test_same_source_in_any_order():
+    sources = {build_source(seed) for seed in range(10)}
+    assert len(sources) == 1
+
+
+def test_same_source_with_any_hash_seed():
+    # Sets of strings are iterated in an order depending on the hash seed
+    code_path = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             os.pardir, 'code')
+    tests_path = os.path.dirname(os.path.realpath(__file__))
+    sources = set()
+    for hash_seed in ('0', '1', '42'):
+        result = subprocess.run(
+            [sys.executable, '-c',
+             'import sys; sys.path[:0] = sys.argv[1:3]; '
+             'import test_build; print(test_build.build_source(0))',
+             code_path, tests_path],
+            env={**os.environ, 'PYTHONHASHSEED': hash_seed},
+            capture_output=True, text=True, check=True)
+        sources.add(result.stdout)
+    assert len(sources) == 1
+    assert sources == {build_source(0) + '\n'}
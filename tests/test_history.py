@@ -0,0 +1,115 @@
+# coding=utf-8
+"""Tests of the history of hosts, on a host changing over time."""
+
+import os
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from docker_info import ContainerInfos, HostInfos
+from history import HistoryStore
+
+# Number of recorded states, over three keyframe intervals
+STATES = 10
+KEYFRAME_INTERVAL = 3
+
+
+def container(name, image, networks):
+    """Return a container with an image and networks."""
+    cont = ContainerInfos(name)
+    cont.image = image
+    cont.networks.update(networks)
+    return cont
+
+
+def host_at(step, collected_at):
+    """
+    Return the state of a host at a step of its life.
+
+    Containers are added, changed and removed along the steps, and some
+    steps are identical to the previous one.
+
+    :param step : index of the state
+    :param collected_at : date of the collection
+    """
+    containers = [container('db', 'postgres:12', ['back'])]
+    if step >= 2:
+        containers.append(container('web', f'nginx:1.{min(step, 6)}',
+                                    ['front', 'back']))
+    if step < 5:
+        containers.append(container('cache', 'redis', ['back']))
+    if 4 <= step < 8:
+        containers.append(container('worker', 'python',
+                                    ['back'] + ['jobs'] * (step % 2)))
+    label = 'Alpha' if step < 7 else 'Alpha (moved)'
+    return HostInfos('alpha', label,
+                     sorted(containers, key=lambda cont: cont.name),
+                     collected_at=collected_at,
+                     addresses=['203.0.113.1'])
+
+
+@pytest.fixture
+def states():
+    """Return the successive states of a host, one hour apart."""
+    start = datetime.now() - timedelta(hours=STATES)
+    return [host_at(step, start + timedelta(hours=step))
+            for step in range(STATES)]
+
+
+def test_rebuild(tmp_path, states):
+    store = HistoryStore(str(tmp_path), KEYFRAME_INTERVAL)
+    for state in states:
+        store.append(state)
+
+    index = (tmp_path / 'history' / 'alpha' / 'index.jsonl').read_text()
+    assert index.count('"full"') == 3
+    for state in states:
+        assert store.rebuild('alpha', state.collected_at).to_dict() \
+            == state.to_dict()
+    # Between two records, the last state before is returned
+    assert store.rebuild('alpha', states[4].collected_at
+                         + timedelta(minutes=30)).to_dict() \
+        == states[4].to_dict()
+    assert store.rebuild('alpha', states[0].collected_at
+                         - timedelta(minutes=1)) is None
+
+
+def test_rebuild_after_restart(tmp_path, states):
+    # A new store rebuilds the last state from disk to compute deltas
+    for state in states[:5]:
+        HistoryStore(str(tmp_path), KEYFRAME_INTERVAL).append(state)
+    store = HistoryStore(str(tmp_path), KEYFRAME_INTERVAL)
+    for state in states[5:]:
+        store.append(state)
+    for state in states:
+        assert store.rebuild('alpha', state.collected_at).to_dict() \
+            == state.to_dict()
+
+
+def test_compact(tmp_path, states):
+    store = HistoryStore(str(tmp_path), KEYFRAME_INTERVAL)
+    for state in states:
+        store.append(state)
+    directory = tmp_path / 'history' / 'alpha'
+    files = set(os.listdir(directory))
+
+    # Keyframes are the records 0, 4 and 8. Keeping the last 4.5 hours
+    # keeps the records from 6, which are rebuilt from the keyframe 4
+    store.retention = 4.5 * 3600
+    store.compact('alpha')
+    kept = (directory / 'index.jsonl').read_text().splitlines()
+    assert len(kept) == STATES - 4
+    assert '"full"' in kept[0]
+    assert states[4].collected_at.isoformat() in kept[0]
+    # Files of the 4 first records are deleted, the second one has none
+    # as nothing changed
+    assert files - set(os.listdir(directory)) == {
+        f"{states[step].collected_at.strftime('%Y%m%dT%H%M%S%f')}"
+        f".{kind}.json.gz"
+        for step, kind in [(0, 'full'), (2, 'delta'), (3, 'delta')]
+    }
+    for state in states[4:]:
+        assert store.rebuild('alpha', state.collected_at).to_dict() \
+            == state.to_dict()
+    assert store.rebuild('alpha', states[3].collected_at) is None
@@ -0,0 +1,86 @@
+# coding=utf-8
+"""Tests of the fleet reports, on a small fleet."""
+
+import pytest
+
+from docker_info import ContainerInfos, HostInfos
+from reports import FleetTable
+
+
+def container(name, image, ports=None, volumes=(), url=None):
+    """Return a container with published ports, volumes and a route."""
+    cont = ContainerInfos(name)
+    cont.image = image
+    for exposed, host_ports in (ports or {}).items():
+        cont.ports[exposed].update(host_ports)
+    for volume in volumes:
+        cont.volumes[volume].add('/data')
+    cont.url = url
+    return cont
+
+
+@pytest.fixture
+def table():
+    """Return the table of three hosts, one of them without containers."""
+    hosts = [
+        HostInfos('alpha', 'Alpha', [
+            container('web', 'nginx', {'80/tcp': {'8080'}}, ['static'],
+                      'Host:www.example.com'),
+            container('app', 'python', {'5000': {'5000'}}, ['static']),
+            container('debug', 'busybox', {'80/tcp': {'8081'}})
+        ]),
+        HostInfos('beta', 'Beta', [
+            container('web', 'nginx', {'80/tcp': {'8080'}}, ['static']),
+            container('db', 'postgres', {}, ['pgdata'])
+        ]),
+        HostInfos('gamma', 'Gamma', [])
+    ]
+    return FleetTable(hosts, {'alpha': ['debug']})
+
+
+def test_counts(table):
+    report = table.report()
+    assert report['hosts'] == 3
+    assert report['containers'] == 4
+
+
+def test_images(table):
+    assert table.images_report() == {
+        'nginx': {'containers': 2, 'hosts': 2},
+        'postgres': {'containers': 1, 'hosts': 1},
+        'python': {'containers': 1, 'hosts': 1}
+    }
+
+
+def test_ports(table):
+    report = table.ports_report()
+    assert report['usage'] == {
+        '5000/tcp': {'containers': 1, 'hosts': 1},
+        '8080/tcp': {'containers': 2, 'hosts': 2}
+    }
+    assert report['collisions'] == {'8080/tcp': ['alpha/web', 'beta/web']}
+
+
+def test_volumes(table):
+    # pgdata and the static volume of beta are not shared
+    assert table.volumes_report() == {
+        'alpha': {'static': ['alpha/app', 'alpha/web']}
+    }
+
+
+def test_routes(table):
+    assert table.routes_report() == {
+        'alpha': {'routes': 1, 'urls': ['www.example.com']},
+        'beta': {'routes': 0, 'urls': []},
+        'gamma': {'routes': 0, 'urls': []}
+    }
+
+
+def test_empty_fleet():
+    report = FleetTable([HostInfos('alpha', 'Alpha', [])], {}).report()
+    assert report['hosts'] == 1
+    assert report['containers'] == 0
+    assert report['images'] == {}
+    assert report['ports'] == {'usage': {}, 'collisions': {}}
+    assert report['volumes'] == {}
+    assert report['routes'] == {'alpha': {'routes': 0, 'urls': []}}